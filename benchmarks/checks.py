@@ -0,0 +1,102 @@
+""" Regression checks for pytube, run against the local fake gdata server.
+
+    Usage:
+        python -m benchmarks.checks
+
+    Every check_* function gets a running FakeGdataServer and raises
+    AssertionError when pytube misbehaves. Prints one line per check and
+    exits non-zero if any failed.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+
+from benchmarks.fakeserver import FakeGdataConfig, FakeGdataServer
+from pytube.harvest import CommentHarvester
+from pytube.stream import StreamRegistry
+from pytube.timeseries import StatsStore
+from pytube.utils import extract_video_ids
+
+
+def check_negative_index_with_known_count(server):
+    # a video's comment stream knows its count from the video entry, so
+    # negative indexes resolve without fetching anything first
+    server.config.comments = 60
+    client = server.client()
+    video = client.video('tailcheck01')
+    expected = [c.id for c in client.video_comments(video.id)]
+    assert len(expected) == 60, len(expected)
+    for k in (1, 10, 11, 50, 60):
+        comments = client.video('tailcheck01').comments
+        assert comments[-k].id == expected[-k], k
+
+
+def check_harvest_sees_grown_feed(server):
+    # a registry holding an older count of a comment feed must not make the
+    # harvester stop early once the feed has grown
+    client = server.client(stream_registry=StreamRegistry())
+    server.config.comments = 60
+    assert len(list(client.video_comments('growcheck01'))) == 60
+    server.config.comments = 120
+    progress = {}
+    comments = list(CommentHarvester(client, progress=progress).harvest(['growcheck01']))
+    assert len(comments) == 120, len(comments)
+    assert client.video_comments('growcheck01').count == 120
+
+
+def check_mobile_url_forms(server):
+    urls = [
+        'http://m.youtube.com/watch?v=mobile00001',
+        'http://m.youtube.com/#/watch?v=mobile00002',
+        'http://m.youtube.com/#/watch?feature=related&v=mobile00003',
+        'http://www.youtube.com/watch#!v=mobile00004',
+    ]
+    found = list(extract_video_ids(urls))
+    assert found == ['mobile%05d' % n for n in (1, 2, 3, 4)], found
+
+
+def check_stats_out_of_order(server):
+    directory = tempfile.mkdtemp()
+    try:
+        with StatsStore(os.path.join(directory, 'stats.log')) as store:
+            store.record('video:x', {'views': 1}, 100)
+            store.record('video:x', {'views': 2}, 100)
+            try:
+                store.record('video:x', {'views': 3}, 50)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('out of order sample was accepted')
+            timestamps, columns = store.series('video:x')
+            assert list(timestamps) == [100, 100], timestamps
+    finally:
+        shutil.rmtree(directory)
+
+
+CHECKS = [
+    check_negative_index_with_known_count,
+    check_harvest_sees_grown_feed,
+    check_mobile_url_forms,
+    check_stats_out_of_order,
+]
+
+
+def main(argv=None):
+    failed = 0
+    for check in CHECKS:
+        with FakeGdataServer(FakeGdataConfig()) as server:
+            try:
+                check(server)
+            except Exception:
+                failed += 1
+                sys.stdout.write('FAIL %s\n' % check.__name__)
+                traceback.print_exc()
+            else:
+                sys.stdout.write('ok   %s\n' % check.__name__)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
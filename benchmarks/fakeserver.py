@@ -0,0 +1,315 @@
+""" A local stand-in for the gdata API, for benchmarking pytube offline.
+
+    The server generates synthetic (but structurally faithful) JSON feeds for
+    users, uploads, searches, comments, related videos and video responses.
+    Latency, feed sizes and error rates are configurable so that benchmarks
+    can model a slow or flaky API without touching the network.
+"""
+try: import simplejson as json
+except ImportError: import json
+import BaseHTTPServer
+import SocketServer
+import datetime
+import random
+import threading
+import time
+import urlparse
+
+import pytube.client
+
+
+class FakeGdataConfig(object):
+    """ Knobs controlling the shape and behavior of the fake gdata server.
+
+        latency     - seconds to sleep before answering each request
+        jitter      - extra random latency, uniformly drawn from [0, jitter)
+        error_rate  - fraction of requests answered with a 503
+        feed_count  - openSearch$totalResults reported for every feed
+        page_limit  - maximum entries served per page, regardless of the
+                      max-results the client asked for
+        comments    - number of comments on every video
+        seed        - seed for the random generator, for repeatable runs
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0,
+                 feed_count=1000, page_limit=50, comments=100, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.feed_count = feed_count
+        self.page_limit = page_limit
+        self.comments = comments
+        self.seed = seed
+
+
+def _ts(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+class FeedFactory(object):
+    """ Builds synthetic gdata JSON documents.
+
+        Every document is derived deterministically from the ids in the
+        request, so the same url always returns the same data.
+    """
+
+    EPOCH = datetime.datetime(2011, 1, 1)
+    CATEGORIES = ['Music', 'Comedy', 'Howto', 'Education', 'Autos', 'Sports']
+
+    def __init__(self, base_url, config):
+        self.base_url = base_url
+        self.config = config
+
+    def _video_id(self, n):
+        return ('v%010d' % n)[-11:]
+
+    def video_entry(self, video_id, author='benchuser'):
+        n = abs(hash(video_id))
+        published = self.EPOCH + datetime.timedelta(minutes=n % 500000)
+        category = self.CATEGORIES[n % len(self.CATEGORIES)]
+        api_id = 'http://gdata.youtube.com/feeds/api/videos/' + video_id
+        schemas = 'http://gdata.youtube.com/schemas/2007'
+        return {
+            u'id': {u'$t': api_id},
+            u'published': {u'$t': _ts(published)},
+            u'updated': {u'$t': _ts(published + datetime.timedelta(days=1))},
+            u'title': {u'$t': u'Synthetic video %s' % video_id},
+            u'author': [{u'name': {u'$t': author}}],
+            u'category': [
+                {u'scheme': schemas + '/categories.cat', u'term': category, u'label': category},
+                {u'scheme': schemas + '/keywords.cat', u'term': u'bench'},
+                {u'scheme': schemas + '/keywords.cat', u'term': u'k%d' % (n % 97)},
+            ],
+            u'link': [
+                {u'rel': schemas + '#video.related',
+                 u'href': '%s/feeds/api/videos/%s/related' % (self.base_url, video_id)},
+                {u'rel': schemas + '#video.responses',
+                 u'href': '%s/feeds/api/videos/%s/responses' % (self.base_url, video_id)},
+                {u'rel': u'edit',
+                 u'href': '%s/feeds/api/users/%s/uploads/%s' % (self.base_url, author, video_id)},
+            ],
+            u'media$group': {
+                u'yt$videoid': {u'$t': video_id},
+                u'media$description': {u'$t': u'Description for %s. ' % video_id * 4},
+                u'yt$duration': {u'seconds': str(n % 3600)},
+                u'yt$uploaded': {u'$t': _ts(published)},
+                u'yt$aspectRatio': {u'$t': u'widescreen'},
+            },
+            u'yt$rating': {u'numLikes': str(n % 10000), u'numDislikes': str(n % 300)},
+            u'yt$statistics': {u'favoriteCount': str(n % 5000), u'viewCount': str(n % 10000000)},
+            u'gd$comments': {u'gd$feedLink': {u'countHint': self.config.comments}},
+            u'yt$accessControl': [
+                {u'action': u'comment', u'permission': u'allowed'},
+                {u'action': u'embed', u'permission': u'allowed'},
+            ],
+        }
+
+    def comment_entry(self, video_id, n):
+        ts = _ts(self.EPOCH + datetime.timedelta(minutes=n))
+        return {
+            u'id': {u'$t': u'http://gdata.youtube.com/feeds/api/videos/%s/comments/c%d' % (video_id, n)},
+            u'author': [{u'name': {u'$t': u'commenter%d' % (n % 50)}}],
+            u'title': {u'$t': u'Comment %d' % n},
+            u'content': {u'$t': u'Synthetic comment number %d on %s' % (n, video_id)},
+            u'published': {u'$t': ts},
+            u'updated': {u'$t': ts},
+        }
+
+    def _page(self, query, total):
+        """ Returns the 0-indexed (start, stop) range a page request covers """
+        start = int(query.get('start-index', 1)) - 1
+        size = int(query.get('max-results', 25))
+        size = min(size, self.config.page_limit)
+        return start, max(start, min(start + size, total))
+
+    def _feed(self, title, entries, total):
+        return {
+            u'version': u'1.0',
+            u'feed': {
+                u'title': {u'$t': title},
+                u'updated': {u'$t': _ts(self.EPOCH)},
+                u'openSearch$totalResults': {u'$t': total},
+                u'link': [],
+                u'entry': entries,
+            },
+        }
+
+    def video_feed(self, title, prefix, query, author='benchuser'):
+        total = self.config.feed_count
+        start, stop = self._page(query, total)
+        entries = [
+            self.video_entry(self._video_id(hash(prefix) % 100000 * 100000 + i), author)
+            for i in xrange(start, stop)
+        ]
+        return self._feed(title, entries, total)
+
+    def comment_feed(self, video_id, query):
+        total = self.config.comments
+        start, stop = self._page(query, total)
+        entries = [self.comment_entry(video_id, i) for i in xrange(start, stop)]
+        return self._feed(u'Comments on %s' % video_id, entries, total)
+
+    def profile(self, username):
+        schemas = 'http://gdata.youtube.com/schemas/2007'
+        return {
+            u'version': u'1.0',
+            u'entry': {
+                u'id': {u'$t': u'http://gdata.youtube.com/feeds/api/users/' + username},
+                u'yt$username': {u'$t': username},
+                u'media$thumbnail': {u'url': u'http://example.invalid/%s.jpg' % username},
+                u'title': {u'$t': username},
+                u'updated': {u'$t': _ts(self.EPOCH)},
+                u'author': [{u'name': {u'$t': username}}],
+                u'yt$age': {u'$t': u'30'},
+                u'yt$location': {u'$t': u'US'},
+                u'yt$statistics': {
+                    u'lastWebAccess': _ts(self.EPOCH),
+                    u'subscriberCount': str(abs(hash(username)) % 100000),
+                    u'totalUploadViews': str(abs(hash(username)) % 10000000),
+                    u'videoWatchCount': u'0',
+                    u'viewCount': str(abs(hash(username)) % 1000000),
+                },
+                u'gd$feedLink': [
+                    {u'rel': schemas + '#user.uploads',
+                     u'href': '%s/feeds/api/users/%s/uploads' % (self.base_url, username),
+                     u'countHint': self.config.feed_count},
+                ],
+                u'link': [],
+            },
+        }
+
+    def route(self, path, query):
+        """ Maps a request path onto a JSON document, or None for a 404 """
+        parts = [p for p in path.split('/') if p][2:]  # strip 'feeds/api'
+        if parts == ['videos']:
+            return self.video_feed(u'Search results', 'q:' + query.get('q', ''), query)
+        if len(parts) == 2 and parts[0] == 'videos':
+            return {u'version': u'1.0', u'entry': self.video_entry(parts[1])}
+        if len(parts) == 3 and parts[0] == 'videos':
+            if parts[2] == 'comments':
+                return self.comment_feed(parts[1], query)
+            if parts[2] in ('related', 'responses'):
+                return self.video_feed(parts[2], parts[2] + ':' + parts[1], query)
+        if len(parts) == 2 and parts[0] == 'users':
+            return self.profile(parts[1])
+        if len(parts) == 3 and parts[0] == 'users' and parts[2] == 'uploads':
+            return self.video_feed(u'Uploads by %s' % parts[1], 'u:' + parts[1], query, parts[1])
+        return None
+
+
+class FakeGdataHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay(self):
+        config = self.server.config
+        delay = config.latency
+        if config.jitter:
+            delay += self.server.random() * config.jitter
+        if delay:
+            time.sleep(delay)
+        self.server.count_request()
+        if config.error_rate and self.server.random() < config.error_rate:
+            self._send(503, 'Service Unavailable', 'text/plain')
+            return False
+        return True
+
+    def _send(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if not self._delay():
+            return
+        url = urlparse.urlparse(self.path)
+        query = dict(urlparse.parse_qsl(url.query))
+        data = self.server.factory.route(url.path, query)
+        if data is None:
+            self._send(404, 'Video not found', 'text/plain')
+            return
+        self._send(200, json.dumps(data))
+
+    def do_PUT(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        self.rfile.read(length)
+        if not self._delay():
+            return
+        self._send(200, '<entry/>', 'application/atom+xml')
+
+    def do_POST(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        self.rfile.read(length)
+        if not self._delay():
+            return
+        if self.path.startswith('/accounts/ClientLogin'):
+            self._send(200, 'SID=fake\nLSID=fake\nAuth=fakeauthtoken\n', 'text/plain')
+            return
+        self._send(201, '<entry/>', 'application/atom+xml')
+
+
+class FakeGdataServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ A threaded HTTP server answering gdata requests with synthetic data.
+
+        Use as a context manager, or call start() and stop() yourself:
+
+            with FakeGdataServer(FakeGdataConfig(latency=0.05)) as server:
+                client = server.client()
+                list(client.user_videos('someone')[:100])
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), FakeGdataHandler)
+        self.config = config or FakeGdataConfig()
+        self.base_url = 'http://%s:%s' % self.server_address
+        self.factory = FeedFactory(self.base_url, self.config)
+        self.requests = 0
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def client_class(self):
+        """ Returns a Client subclass whose api urls point at this server """
+        attrs = {}
+        for name in dir(pytube.client.Client):
+            value = getattr(pytube.client.Client, name)
+            if name.endswith('_URL') and isinstance(value, str):
+                url = urlparse.urlparse(value)
+                attrs[name] = self.base_url + value[len(url.scheme) + 3 + len(url.netloc):]
+        return type('LocalClient', (pytube.client.Client,), attrs)
+
+    def client(self, *args, **kwargs):
+        """ Returns a client instance talking to this server """
+        if not args:
+            args = ('pytube-benchmarks',)
+        return self.client_class()(*args, **kwargs)
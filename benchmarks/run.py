@@ -0,0 +1,264 @@
+""" Runs the pytube benchmark suite against a local fake gdata server.
+
+    Usage:
+        python -m benchmarks.run [options] > results.json
+        python -m benchmarks.run --compare before.json after.json
+
+    Results are emitted as JSON so that runs from different commits can be
+    stored and compared.
+"""
+try: import simplejson as json
+except ImportError: import json
+import gc
+import optparse
+import platform
+import random
+import subprocess
+import sys
+import time
+import urllib2
+
+from benchmarks.fakeserver import FakeGdataConfig, FakeGdataServer
+import pytube.exceptions
+
+
+def deep_sizeof(obj, exclude=()):
+    """ Approximates the memory held by obj and everything it references,
+        skipping the objects in exclude (and anything only reachable
+        through them).
+    """
+    seen = set(id(o) for o in exclude)
+    stack = [obj]
+    size = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.iterkeys())
+            stack.extend(o.itervalues())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        if hasattr(o, '__dict__'):
+            stack.append(o.__dict__)
+    return size
+
+
+class Benchmark(object):
+    """ Shared timing plumbing; subclasses implement run_once. """
+
+    name = None
+
+    def __init__(self, server, options):
+        self.server = server
+        self.options = options
+        self.random = random.Random(options.seed)
+
+    def run_once(self, client):
+        """ Performs one round of work, adding every completed operation to
+            self.done as it goes.
+        """
+        raise NotImplementedError
+
+    def run(self):
+        timings = []
+        operations = 0
+        errors = 0
+        requests = self.server.requests
+        for i in xrange(self.options.rounds):
+            client = self.server.client()
+            gc.collect()
+            self.done = 0
+            started = time.time()
+            try:
+                self.run_once(client)
+            except (urllib2.HTTPError, pytube.exceptions.VideoUpdateException):
+                # injected server errors abort the round, but still count,
+                # as do the operations completed before the error
+                errors += 1
+            timings.append(time.time() - started)
+            operations += self.done
+        total = sum(timings)
+        return {
+            'rounds': len(timings),
+            'operations': operations,
+            'requests': self.server.requests - requests,
+            'errors': errors,
+            'seconds': total,
+            'min_round': min(timings),
+            'max_round': max(timings),
+            'ops_per_second': operations / total if total else None,
+        }
+
+
+class IterationBenchmark(Benchmark):
+    """ Iterates the front of an uploads stream """
+    name = 'iteration'
+
+    def run_once(self, client):
+        for video in client.user_videos('bench%d' % self.random.randint(0, 1 << 30)):
+            self.done += 1
+            if self.done >= self.options.items:
+                break
+
+
+class SliceBenchmark(Benchmark):
+    """ Takes random slices out of fresh streams """
+    name = 'slicing'
+
+    def run_once(self, client):
+        stream = client.user_videos('bench%d' % self.random.randint(0, 1 << 30))
+        for i in xrange(self.options.slices):
+            start = self.random.randint(0, stream.MAX_RESULTS - self.options.slice_size)
+            self.done += len(stream[start:start + self.options.slice_size])
+
+
+class LookupBenchmark(Benchmark):
+    """ Fetches individual videos by id """
+    name = 'video_lookup'
+
+    def run_once(self, client):
+        for i in xrange(self.options.lookups):
+            client.video('l%010d' % self.random.randint(0, 10 ** 9))
+            self.done += 1
+
+
+class UpdateBenchmark(Benchmark):
+    """ PUTs video metadata back to the server """
+    name = 'video_update'
+
+    def run_once(self, client):
+        video = client.video('u%010d' % self.random.randint(0, 10 ** 9))
+        for i in xrange(self.options.updates):
+            video.title = u'Updated title %d' % i
+            video.update()
+            self.done += 1
+
+
+BENCHMARKS = [IterationBenchmark, SliceBenchmark, LookupBenchmark, UpdateBenchmark]
+
+
+def measure_memory(server, options):
+    """ Reports the average deep size of the objects a stream produces.
+
+        Object sizes don't depend on latency or errors, so pass a server
+        that doesn't inject errors.
+    """
+    client = server.client()
+    videos = list(client.user_videos('memory')[:options.items])
+    comments = list(client.video_comments(videos[0].id)[:options.items])
+    return {
+        'video_bytes': sum(deep_sizeof(v, [client]) for v in videos) / len(videos),
+        'comment_bytes': sum(deep_sizeof(c, [client]) for c in comments) / len(comments),
+        'videos': len(videos),
+        'comments': len(comments),
+    }
+
+
+def git_revision():
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return process.communicate()[0].strip() or None
+    except OSError:
+        return None
+
+
+def run(options):
+    config = FakeGdataConfig(
+        latency=options.latency,
+        jitter=options.jitter,
+        error_rate=options.error_rate,
+        feed_count=options.feed_count,
+        page_limit=options.page_size,
+        comments=options.comments,
+        seed=options.seed,
+    )
+    selected = options.only and options.only.split(',')
+    results = {}
+    with FakeGdataServer(config) as server:
+        for cls in BENCHMARKS:
+            if selected and cls.name not in selected:
+                continue
+            results[cls.name] = cls(server, options).run()
+    if not selected or 'memory' in selected:
+        reliable = FakeGdataConfig(
+            feed_count=config.feed_count,
+            page_limit=config.page_limit,
+            comments=config.comments,
+            seed=config.seed,
+        )
+        with FakeGdataServer(reliable) as server:
+            results['memory'] = measure_memory(server, options)
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'config': dict(config.__dict__),
+        'options': dict(vars(options)),
+        'results': results,
+    }
+
+
+def compare(before, after):
+    """ Returns lines describing the change between two result documents """
+    lines = []
+    for name in sorted(set(before['results']) & set(after['results'])):
+        old, new = before['results'][name], after['results'][name]
+        for key in sorted(set(old) & set(new)):
+            if not isinstance(old[key], (int, long, float)) or not old[key]:
+                continue
+            change = (new[key] - old[key]) * 100.0 / old[key]
+            lines.append('%-14s %-16s %14.4f %14.4f %+8.1f%%' % (
+                name, key, old[key], new[key], change))
+    return lines
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--latency', type='float', default=0.0,
+                      help='seconds of simulated latency per request')
+    parser.add_option('--jitter', type='float', default=0.0,
+                      help='maximum extra random latency per request')
+    parser.add_option('--error-rate', type='float', default=0.0,
+                      help='fraction of requests answered with a 503')
+    parser.add_option('--feed-count', type='int', default=5000,
+                      help='total results reported by every feed')
+    parser.add_option('--page-size', type='int', default=50,
+                      help='maximum entries the server returns per page')
+    parser.add_option('--comments', type='int', default=100,
+                      help='comments per video')
+    parser.add_option('--rounds', type='int', default=3)
+    parser.add_option('--items', type='int', default=500,
+                      help='entries consumed per iteration round')
+    parser.add_option('--slices', type='int', default=20,
+                      help='random slices taken per slicing round')
+    parser.add_option('--slice-size', type='int', default=10)
+    parser.add_option('--lookups', type='int', default=50,
+                      help='video lookups per round')
+    parser.add_option('--updates', type='int', default=20,
+                      help='video updates per round')
+    parser.add_option('--seed', type='int', default=0)
+    parser.add_option('--only', default=None,
+                      help='comma separated benchmark names to run')
+    parser.add_option('--compare', action='store_true', default=False,
+                      help='compare two result files instead of running')
+    options, args = parser.parse_args(argv)
+
+    if options.compare:
+        if len(args) != 2:
+            parser.error('--compare needs two result files')
+        before, after = [json.load(open(path)) for path in args]
+        for line in compare(before, after):
+            sys.stdout.write(line + '\n')
+        return 0
+
+    json.dump(run(options), sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,3 @@
 from pytube.exceptions import *
 from pytube.client import Client
-from pytube.utils import video_id_from_youtube_url
+from pytube.utils import video_id_from_youtube_url, extract_video_ids, count_video_ids
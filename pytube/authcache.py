@@ -0,0 +1,186 @@
+""" Caches for ClientLogin auth tokens.
+
+    Logging in with ClientLogin is slow, and logging in too often can get an
+    account CaptchaRequired errors. A token cache lets short-lived processes
+    share tokens: Client.authenticate consults the cache before logging in,
+    and stores any new token it gets.
+
+    A token cache is any object with these methods:
+        get(key)            - returns the cached auth data dict, or None
+        set(key, auth_data) - stores an auth data dict
+        delete(key)         - forgets a cached token
+        refresh(key, expired, login)
+                            - replaces the expired auth data under key,
+                              calling login() for new auth data only if no
+                              other process has replaced it already
+    Passwords are never stored; keys include a salted hash of the password,
+    and values are only the auth data google hands back.
+"""
+try: import simplejson as json
+except ImportError: import json
+import contextlib
+import os
+import sqlite3
+import tempfile
+import time
+try: import fcntl
+except ImportError: fcntl = None
+
+
+class FileTokenCache(object):
+    """ Stores tokens in a json file, guarded by a lock file so that
+        concurrent processes don't clobber each other's updates.
+
+        Tokens older than max_age seconds are treated as missing.
+    """
+
+    def __init__(self, path, max_age=None):
+        self.path = path
+        self.max_age = max_age
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive):
+        with open(self.path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _write(self, tokens):
+        # write to a temporary file and rename it over the cache, so readers
+        # never see a partially written file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(tokens, f)
+        os.rename(temp, self.path)
+
+    def _valid(self, entry):
+        if entry is None:
+            return False
+        return self.max_age is None or time.time() - entry['created'] <= self.max_age
+
+    def get(self, key):
+        with self._locked(False):
+            entry = self._read().get(key)
+        if not self._valid(entry):
+            return None
+        return entry['auth_data']
+
+    def set(self, key, auth_data):
+        with self._locked(True):
+            tokens = self._read()
+            tokens[key] = {'auth_data': auth_data, 'created': time.time()}
+            self._write(tokens)
+
+    def delete(self, key):
+        with self._locked(True):
+            tokens = self._read()
+            if tokens.pop(key, None) is not None:
+                self._write(tokens)
+
+    def refresh(self, key, expired, login):
+        # hold the lock through login, so concurrent refreshes wait for
+        # this one and pick up its token
+        with self._locked(True):
+            entry = self._read().get(key)
+            if self._valid(entry) and entry['auth_data'] != expired:
+                return entry['auth_data']
+            auth_data = login()
+            tokens = self._read()
+            tokens[key] = {'auth_data': auth_data, 'created': time.time()}
+            self._write(tokens)
+            return auth_data
+
+
+class SqliteTokenCache(object):
+    """ Stores tokens in a sqlite database; sqlite's own locking handles
+        concurrent access.
+
+        Tokens older than max_age seconds are treated as missing.
+    """
+
+    def __init__(self, path, max_age=None, timeout=30):
+        self.path = path
+        self.max_age = max_age
+        self.timeout = timeout
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS tokens '
+                    '(key TEXT PRIMARY KEY, auth_data TEXT, created REAL)')
+        finally:
+            connection.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=self.timeout)
+
+    def get(self, key):
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                'SELECT auth_data, created FROM tokens WHERE key = ?', (key,)).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        if self.max_age is not None and time.time() - row[1] > self.max_age:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, auth_data):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO tokens (key, auth_data, created) VALUES (?, ?, ?)',
+                    (key, json.dumps(auth_data), time.time()))
+        finally:
+            connection.close()
+
+    def delete(self, key):
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('DELETE FROM tokens WHERE key = ?', (key,))
+        finally:
+            connection.close()
+
+    def refresh(self, key, expired, login):
+        connection = self._connect()
+        connection.isolation_level = None
+        try:
+            # take the write lock before reading, and hold it through login,
+            # so concurrent refreshes wait for this one and pick up its token
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute(
+                    'SELECT auth_data, created FROM tokens WHERE key = ?', (key,)).fetchone()
+                if row is not None and (self.max_age is None or
+                                        time.time() - row[1] <= self.max_age):
+                    auth_data = json.loads(row[0])
+                    if auth_data != expired:
+                        connection.execute('COMMIT')
+                        return auth_data
+                auth_data = login()
+                connection.execute(
+                    'INSERT OR REPLACE INTO tokens (key, auth_data, created) VALUES (?, ?, ?)',
+                    (key, json.dumps(auth_data), time.time()))
+                connection.execute('COMMIT')
+                return auth_data
+            except:
+                connection.execute('ROLLBACK')
+                raise
+        finally:
+            connection.close()
@@ -1,16 +1,22 @@
 try: import simplejson as json
 except ImportError: import json
 import urllib, urllib2
+import binascii
 import datetime
+import hashlib
 import warnings
 import logging
 import httplib
 import contextlib
+import threading
 import urlparse
 import xml.sax.saxutils as saxutils
 
 
+from pytube.query import VideoQuery
+from pytube.scheduler import INTERACTIVE, BATCH
 from pytube.stream import Stream, YtData
+from pytube.transport import UrllibTransport
 from pytube.utils import yt_ts_to_datetime
 import pytube.exceptions
 
@@ -152,7 +158,7 @@ class Video(YtData, LinksMixin):
             self.view_count = int(data[u'yt$statistics'][u'viewCount'])
         if u'gd$comments' in data:
             self.comment_count = int(data[u'gd$comments'][u'gd$feedLink'][u'countHint'])
-            self.comments._count = self.comment_count
+            self.comments._hint_count(self.comment_count)
 
         if u'yt$private' in data[u'media$group']:
             self.private = True
@@ -217,6 +223,7 @@ class Video(YtData, LinksMixin):
             }
         url = urlparse.urlparse(edit_url)
 
+        self.client._acquire(BATCH)
         headers = self.client._default_headers()
         headers['GData-Version'] = 2
         headers['Content-Type'] = 'application/atom+xml'
@@ -245,6 +252,9 @@ class Video(YtData, LinksMixin):
 class VideoStream(Stream, LinksMixin):
     """ Stream for parsing YouTube Video results """
 
+    _feed_attributes = ('title', 'updated', '_links', 'related_videos',
+                        'video_responses', 'insight_url', 'edit_url')
+
     def _handle_data(self, data):
         assert data[u'version'] == u'1.0', "Youtube API version mismatch"
         self._count = int(data[u'feed'][u'openSearch$totalResults'][u'$t'])
@@ -292,13 +302,16 @@ class Comment(object):
 
 class CommentStream(Stream, LinksMixin):
     """ Stream for parsing YouTube Comment results """
+
+    _feed_attributes = VideoStream._feed_attributes
+
     def _handle_data(self, data):
         assert data[u'version'] == u'1.0', "Youtube API version mismatch"
         self._count = int(data[u'feed'][u'openSearch$totalResults'][u'$t'])
         self.title = data[u'feed'][u'title'][u'$t']
         self.updated = yt_ts_to_datetime(data[u'feed'][u'updated'][u'$t'])
         self._parse_links(data[u'feed'][u'link'])
-        return [Comment(d) for d in data['feed']['entry']]
+        return [Comment(d) for d in data['feed'].get('entry', ())]
 
 
 class Client(object):
@@ -307,6 +320,19 @@ class Client(object):
         You must provide an app identifier to use the youtube API.
         You may also provide a developer API key (http://code.google.com/apis/youtube/dashboard/)
         which will be submitted with all API requests.
+
+        All API requests are sent through a transport (see pytube.transport);
+        pass one in to record or replay API traffic.
+
+        A token_cache (see pytube.authcache) lets processes share ClientLogin
+        tokens instead of logging in every time they start.
+
+        A stream_registry (see pytube.stream.StreamRegistry) makes every
+        stream built from this client share its cache with the equivalent
+        streams, so identical feeds are only fetched once.
+
+        A scheduler (see pytube.scheduler) holds requests to a shared rate
+        budget, serving interactive requests before batch work.
     """
 
     GOOGLE_AUTH_URL = 'https://www.google.com/accounts/ClientLogin'
@@ -319,12 +345,19 @@ class Client(object):
     YOUTUBE_SUBSCRIPTIONS_URL = 'http://gdata.youtube.com/feeds/api/users/%(username)s/subscriptions?alt=json&v=2'
     YOUTUBE_RESPONSE_URL = 'http://gdata.youtube.com/feeds/api/videos/%(original_video_id)s/responses'
 
-    def __init__(self, app_name, dev_key=None):
+    def __init__(self, app_name, dev_key=None, transport=None, token_cache=None,
+                 stream_registry=None, scheduler=None):
         self._auth_data = None
+        self._credentials = None
+        self.token_cache = token_cache
+        self.stream_registry = stream_registry
         self.username = None
         self.default_timeout = None
         self.app_name = app_name
         self.dev_key = dev_key
+        self.transport = transport or UrllibTransport()
+        self.scheduler = scheduler
+        self._context = threading.local()
 
     def _default_headers(self):
         """ Headers that should be added to all gdata requests
@@ -349,19 +382,51 @@ class Client(object):
             }
         return {}
 
-    def _gdata_request(self, url, query=None, data=None, headers=None, timeout=None):
+    @contextlib.contextmanager
+    def request_context(self, priority=None, caller=None):
+        """ Tags the requests this thread makes inside the block with a
+            scheduler priority (overriding the client's own tagging) and a
+            caller name for fair queueing.
+        """
+        previous = getattr(self._context, 'value', (None, None))
+        self._context.value = (priority or previous[0], caller or previous[1])
+        try:
+            yield
+        finally:
+            self._context.value = previous
+
+    def _acquire(self, priority=None):
+        """ Waits for the scheduler's permission to send a request """
+        if self.scheduler is None:
+            return
+        context_priority, caller = getattr(self._context, 'value', (None, None))
+        self.scheduler.acquire(context_priority or priority or INTERACTIVE, caller)
+
+    def _gdata_request(self, url, query=None, data=None, headers=None, timeout=None,
+                       priority=None):
         timeout = timeout or self.default_timeout
 
         if query:
             sep = '?' if '?' not in url else '&'
             url += sep + urllib.urlencode(query)
 
-        headers = headers or {}
+        try:
+            return self._gdata_open(url, data, headers, timeout, priority)
+        except pytube.exceptions.TokenExpired:
+            # we can only log in again if we know the credentials
+            if self._credentials is None:
+                raise
+            self._refresh_login()
+            return self._gdata_open(url, data, headers, timeout, priority)
+
+    def _gdata_open(self, url, data, headers, timeout, priority=None):
+        self._acquire(priority)
+        headers = dict(headers or {})
         headers.update(self._default_headers())
 
         request = urllib2.Request(url, data, headers)
         try:
-            return urllib2.urlopen(request, timeout=timeout)
+            return self.transport.open(request, timeout=timeout)
         except urllib2.HTTPError, e:
             if e.getcode() == 401:
                 e.response = e.read()
@@ -370,7 +435,8 @@ class Client(object):
                 raise e
             raise
 
-    def _gdata_json(self, url, query=None, data=None, headers=None, timeout=None):
+    def _gdata_json(self, url, query=None, data=None, headers=None, timeout=None,
+                    priority=None):
         query = query or {}
         query.update({'alt': 'json'})
         return json.load(
@@ -379,7 +445,8 @@ class Client(object):
                 query=query,
                 data=data,
                 headers=headers,
-                timeout=timeout
+                timeout=timeout,
+                priority=priority
             )
         )
 
@@ -445,17 +512,66 @@ class Client(object):
             'authsub_token': token,
         }
 
+    def _token_cache_key(self, username, password):
+        """ Keys cached tokens by the credentials they were issued for, so
+            that a wrong password can't pick up a cached token.
+        """
+        if isinstance(password, unicode):
+            password = password.encode('utf-8')
+        salt = (u'%s:%s' % (self.app_name, username)).encode('utf-8')
+        digest = hashlib.pbkdf2_hmac('sha256', password, salt, 10000)
+        return u'%s:%s:%s' % (self.app_name, username, binascii.hexlify(digest))
+
+    def _refresh_login(self):
+        """ Replaces an expired ClientLogin token with a fresh one.
+
+            With a token cache, another process may already have logged in
+            again; its token is used instead of logging in once more.
+        """
+        username, password = self._credentials
+        expired, self._auth_data = self._auth_data, None
+
+        def login():
+            self._client_login(username, password)
+            return self._auth_data
+
+        if self.token_cache is None:
+            login()
+        else:
+            self._auth_data = self.token_cache.refresh(
+                self._token_cache_key(username, password), expired, login)
+            self.username = username
+
     def authenticate(self, username=None, password=None, captcha=None, authsub=None):
         """ Authenticates this client with YouTube.
 
             You may provide either a username and password, which will invoke
             the gdata ClientLogin, or you may pass an authsub token.
+
+            ClientLogin tokens are looked up in (and saved to) the client's
+            token cache, if it has one. When a request fails because the
+            token expired, the client logs in again and retries it once.
         """
         assert (username and password) or authsub
         if username and password:
-            self._client_login(username, password, captcha)
+            # hashing the password is slow; only do it to use the cache
+            key = None
+            if self.token_cache is not None:
+                key = self._token_cache_key(username, password)
+            cached = None
+            if key is not None and captcha is None:
+                cached = self.token_cache.get(key)
+            if cached is not None:
+                self._auth_data = cached
+                self.username = username
+            else:
+                self._client_login(username, password, captcha)
+                if key is not None:
+                    self.token_cache.set(key, self._auth_data)
+            self._credentials = (username, password)
         elif authsub:
-            self._authsub_login()
+            self._authsub_login(authsub)
+            self._credentials = None
 
     def unauthenticate(self):
         """ Unauthenticates this client.
@@ -465,6 +581,7 @@ class Client(object):
             references to the token.
         """
         self._auth_data = None
+        self._credentials = None
         self.username = None
 
     def user_profile(self, username='default'):
@@ -474,11 +591,16 @@ class Client(object):
         data = self._gdata_json(self.YOUTUBE_PROFILE_URL % {'username': username })
         return Profile(self, data)
 
-    def user_videos(self, username='default'):
+    def user_videos(self, username='default', query=None):
         """ Gets a user's uploaded video stream. If authenticated, may be
             called without passing a username to get your own videos.
+
+            A pytube.query.VideoQuery may be passed to filter the uploads.
         """
-        return VideoStream(self, self.YOUTUBE_UPLOADS_URL % {'username': username })
+        uri = self.YOUTUBE_UPLOADS_URL % {'username': username }
+        if query is None:
+            return VideoStream(self, uri)
+        return query.apply(VideoStream(self, uri, query=query.params(include_author=False)))
 
     def user_subscriptions(self, username='default'):
         """ Gets YouTube channel ids that username is following. If
@@ -505,8 +627,15 @@ class Client(object):
 
     def video_search(self, q=None, **query):
         """ Searches YouTube for videos matching a search term
+
+            q may be a search string, or a pytube.query.VideoQuery.
         """
-        query['q'] = q
+        if isinstance(q, VideoQuery):
+            params = q.params()
+            params.update(query)
+            return q.apply(VideoStream(self, self.YOUTUBE_SEARCH_URL, query=params))
+        if q is not None:
+            query['q'] = q
         return VideoStream(self, self.YOUTUBE_SEARCH_URL, query=query)
 
     def video_comments(self, video_id):
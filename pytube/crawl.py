@@ -0,0 +1,251 @@
+""" A multi-process crawl driver.
+
+    Parsing API responses is CPU bound, so a single process crawling with
+    pytube is limited by the GIL. This module shards a list of crawl jobs
+    across a process pool; every worker runs its own Client, and the parent
+    merges the results into one JSON-lines file.
+
+    Jobs are strings of the form kind:argument, where kind is one of
+        user    - every video uploaded by the username
+        video   - a single video id
+        search  - the results of a video search
+    Lines without a kind use the default kind (user unless told otherwise).
+
+    Completed jobs are appended to a checkpoint file, along with the size of
+    the output once their records were written; when a crawl is restarted,
+    jobs already in the checkpoint are skipped, and anything written to the
+    output after the last checkpointed job is truncated away. Jobs that fail
+    are logged and not checkpointed, so they are retried on the next run.
+
+    Usage:
+        python -m pytube.crawl -a my-app -o videos.jsonl jobs.txt
+"""
+try: import simplejson as json
+except ImportError: import json
+import logging
+import multiprocessing
+import optparse
+import os
+import sys
+
+import pytube.client
+from pytube.scheduler import BATCH, RequestScheduler
+
+
+JOB_KINDS = ('user', 'video', 'search')
+
+# the Client and per-job video limit used by each worker process; set by
+# _init_worker
+_client = None
+_limit = None
+
+
+def parse_job(line, default_kind='user'):
+    """ Splits a job line into (kind, argument) """
+    kind, sep, argument = line.partition(':')
+    if sep and kind in JOB_KINDS:
+        return kind, argument
+    return default_kind, line
+
+
+def video_record(video):
+    """ Flattens a Video into a json-serializable dict """
+    record = {
+        'id': video.id,
+        'title': video.title,
+        'author': video.author,
+        'category': unicode(video.category),
+        'keywords': video.keywords,
+        'published': video.published.isoformat(),
+        'updated': video.updated.isoformat(),
+        'private': video.private,
+    }
+    for name in ('description', 'duration', 'view_count', 'favorite_count',
+                 'like_count', 'dislike_count', 'comment_count'):
+        if hasattr(video, name):
+            record[name] = getattr(video, name)
+    return record
+
+
+def _init_worker(client_class, app_name, dev_key, limit, client_kwargs, rate):
+    global _client, _limit
+    client_kwargs = dict(client_kwargs or {})
+    if rate and client_kwargs.get('scheduler') is None:
+        client_kwargs['scheduler'] = RequestScheduler(rate)
+    _client = client_class(app_name, dev_key, **client_kwargs)
+    _limit = limit
+
+
+def _fetch_videos(kind, argument):
+    if kind == 'video':
+        videos = [_client.video(argument)]
+    elif kind == 'search':
+        videos = _client.video_search(argument)
+    else:
+        videos = _client.user_videos(argument)
+    if _limit:
+        videos = videos[:_limit]
+    return [video_record(v) for v in videos]
+
+
+def _crawl_job(job):
+    """ Runs one job in a worker; returns (job, records, error) """
+    kind, argument = job
+    try:
+        with _client.request_context(priority=BATCH, caller='crawl'):
+            return job, _fetch_videos(kind, argument), None
+    except Exception, e:
+        return job, None, '%s: %s' % (e.__class__.__name__, e)
+
+
+def _job_line(job):
+    return '%s:%s' % job
+
+
+def _truncate(path, size):
+    """ Shortens the file at path to size bytes, if it is longer """
+    if os.path.getsize(path) > size:
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+
+
+def _last_line_end(path):
+    """ Returns the size of path up to and including its last newline """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            newline = f.read(end - start).rfind('\n')
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+def read_checkpoint(path):
+    """ Returns (done, offset): the set of job lines recorded as complete in
+        path, and the size of the output after the last of them was written
+        (None if unknown). A last line cut short by a crash is dropped from
+        the file.
+    """
+    done, offset = set(), None
+    if not path or not os.path.exists(path):
+        return done, offset
+    complete = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            complete += len(line)
+            job, sep, size = line.rstrip('\n').rpartition('\t')
+            if sep and size.isdigit():
+                done.add(job)
+                offset = int(size)
+            elif line.strip():
+                done.add(line.rstrip('\n'))
+    _truncate(path, complete)
+    return done, offset
+
+
+def crawl(jobs, output, app_name, dev_key=None, processes=None,
+          checkpoint=None, limit=None, default_kind='user',
+          client_class=pytube.client.Client, client_kwargs=None,
+          requests_per_second=None):
+    """ Crawls jobs across a process pool, appending a json line per video
+        to the output path. Returns a (completed, failed) tuple of counts.
+
+        Each worker process builds its own client_class(app_name, dev_key,
+        **client_kwargs). With requests_per_second, every worker's client
+        gets a RequestScheduler with an equal share of that budget, unless
+        client_kwargs already holds a scheduler. A scheduler passed in
+        client_kwargs is copied into each worker, so it limits each worker
+        separately.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    rate = float(requests_per_second) / processes if requests_per_second else None
+    jobs = [parse_job(line.strip(), default_kind) for line in jobs if line.strip()]
+    done, offset = read_checkpoint(checkpoint)
+    if os.path.exists(output):
+        # drop what a crashed run wrote after its last checkpointed job: a
+        # partial line, or the records of a job that will now run again
+        _truncate(output, offset if offset is not None else _last_line_end(output))
+    pending = [job for job in jobs if _job_line(job) not in done]
+    # de-duplicate while keeping the input order
+    seen = set()
+    pending = [job for job in pending if not (job in seen or seen.add(job))]
+
+    completed = failed = 0
+    pool = multiprocessing.Pool(processes, _init_worker,
+                                (client_class, app_name, dev_key, limit, client_kwargs, rate))
+    try:
+        with open(output, 'ab') as out:
+            checkpoint_file = open(checkpoint, 'a') if checkpoint else None
+            try:
+                for job, records, error in pool.imap_unordered(_crawl_job, pending):
+                    if error is not None:
+                        failed += 1
+                        logging.warning('crawl job %s failed: %s', _job_line(job), error)
+                        continue
+                    for record in records:
+                        record['job'] = _job_line(job)
+                    out.write(''.join(json.dumps(record) + '\n' for record in records))
+                    # the results must be on disk before the job is marked done
+                    out.flush()
+                    os.fsync(out.fileno())
+                    if checkpoint_file is not None:
+                        checkpoint_file.write('%s\t%d\n' % (_job_line(job), out.tell()))
+                        checkpoint_file.flush()
+                    completed += 1
+            finally:
+                if checkpoint_file is not None:
+                    checkpoint_file.close()
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return completed, failed
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options] JOBFILE...\n' + __doc__)
+    parser.add_option('-a', '--app-name', help='application identifier (required)')
+    parser.add_option('-k', '--dev-key', help='youtube developer key')
+    parser.add_option('-o', '--output', help='json lines output file (required)')
+    parser.add_option('-c', '--checkpoint',
+                      help='checkpoint file; defaults to OUTPUT.checkpoint')
+    parser.add_option('-p', '--processes', type='int', default=None,
+                      help='worker processes; defaults to the cpu count')
+    parser.add_option('-l', '--limit', type='int', default=None,
+                      help='maximum videos to fetch per job')
+    parser.add_option('-r', '--rate', type='float', default=None,
+                      help='requests per second, shared by all processes')
+    parser.add_option('--kind', default='user', choices=JOB_KINDS,
+                      help='job kind for lines without a kind: prefix')
+    options, args = parser.parse_args(argv)
+    if not options.app_name or not options.output:
+        parser.error('--app-name and --output are required')
+
+    jobs = []
+    for path in args or ['-']:
+        f = sys.stdin if path == '-' else open(path)
+        jobs.extend(f.readlines())
+
+    logging.basicConfig(level=logging.INFO)
+    completed, failed = crawl(
+        jobs, options.output, options.app_name, options.dev_key,
+        processes=options.processes,
+        checkpoint=options.checkpoint or options.output + '.checkpoint',
+        limit=options.limit,
+        default_kind=options.kind,
+        requests_per_second=options.rate,
+    )
+    logging.info('%d jobs completed, %d failed', completed, failed)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -47,3 +47,7 @@ class VideoUpdateException(VideoException):
 
     def __str__(self):
         return self.message
+
+
+class CassetteMiss(Exception):
+    """ A replayed request was not found in the cassette """
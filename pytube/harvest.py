@@ -0,0 +1,134 @@
+""" Concurrent comment harvesting across many videos.
+
+    Iterating video_comments(video_id) for one video after another spends
+    most of its time waiting on the network. CommentHarvester pages the
+    comments of many videos at once, with a fixed number of requests in
+    flight, and yields (video_id, Comment) pairs as pages arrive:
+
+        harvester = CommentHarvester(client, concurrency=16)
+        for video_id, comment in harvester.harvest(client.user_videos('someone')):
+            ...
+
+    The pages of any one video are fetched in order, so comments for a given
+    video are yielded in feed order, although comments of different videos
+    are interleaved.
+
+    Progress is tracked per video in a dict (or any mapping, e.g. a shelf)
+    mapping video ids to the number of comments yielded so far, or DONE once
+    a video is finished. Passing the same mapping to a new harvester resumes
+    where the last one stopped.
+"""
+import logging
+import threading
+import Queue
+
+from pytube.stream import Stream
+
+
+# progress value for videos whose comments have all been harvested
+DONE = -1
+
+
+class CommentHarvester(object):
+    """ Harvests comments for many videos with `concurrency` worker threads.
+
+        Videos whose comments could not be fetched are recorded in
+        self.errors (video id -> exception) and skipped.
+    """
+
+    def __init__(self, client, concurrency=8, progress=None):
+        self.client = client
+        self.concurrency = concurrency
+        self.progress = progress if progress is not None else {}
+        self.errors = {}
+
+    def _fetch(self, video_id, start):
+        """ Fetches one page of comments; returns (comments, finished) """
+        stream = self.client.video_comments(video_id)
+        comments, count = [], None
+        with self.client.request_context(caller='harvest'):
+            for data in stream.iter_pages(start, start + Stream.MAX_PAGE_SIZE):
+                comments += stream._handle_data(data)
+                count = int(data[u'feed'][u'openSearch$totalResults'][u'$t'])
+        # judge the end by this page alone; a shared stream count may be stale
+        stop = start + len(comments)
+        finished = (len(comments) < Stream.MAX_PAGE_SIZE or
+                    count is None or stop >= count or stop >= Stream.MAX_RESULTS)
+        return comments, finished
+
+    def _work(self, tasks, results):
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            video_id, start = task
+            try:
+                comments, finished = self._fetch(video_id, start)
+            except Exception, e:
+                results.put((video_id, start, None, True, e))
+            else:
+                results.put((video_id, start, comments, finished, None))
+
+    def harvest(self, videos):
+        """ Yields (video_id, Comment) for every comment on every video.
+
+            videos may be an iterable of video ids or of Video objects, such
+            as a VideoStream; it is consumed lazily.
+        """
+        tasks = Queue.Queue()
+        results = Queue.Queue()
+        workers = [threading.Thread(target=self._work, args=(tasks, results))
+                   for i in xrange(self.concurrency)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        videos = iter(videos)
+        active = [0]
+
+        def start_videos():
+            # keep one page per worker in flight
+            while active[0] < self.concurrency:
+                try:
+                    video = videos.next()
+                except StopIteration:
+                    return
+                video_id = getattr(video, 'id', video)
+                start = self.progress.get(video_id, 0)
+                if start == DONE:
+                    continue
+                tasks.put((video_id, start))
+                active[0] += 1
+
+        try:
+            start_videos()
+            while active[0]:
+                video_id, start, comments, finished, error = results.get()
+                if error is not None:
+                    logging.warning('harvesting comments for %s failed: %s', video_id, error)
+                    self.errors[video_id] = error
+                    active[0] -= 1
+                    start_videos()
+                    continue
+                if not finished:
+                    # request the next page while this one is consumed
+                    tasks.put((video_id, start + len(comments)))
+                for i, comment in enumerate(comments):
+                    # count the comment before handing it over, so that a
+                    # consumer stopping here resumes after it
+                    self.progress[video_id] = start + i + 1
+                    yield video_id, comment
+                if finished:
+                    self.progress[video_id] = DONE
+                    active[0] -= 1
+                    start_videos()
+        finally:
+            for worker in workers:
+                tasks.put(None)
+
+
+def harvest_comments(client, videos, concurrency=8, progress=None):
+    """ Yields (video_id, Comment) for every comment on every video; see
+        CommentHarvester.
+    """
+    return CommentHarvester(client, concurrency, progress).harvest(videos)
@@ -0,0 +1,274 @@
+""" An in-memory index over fetched videos.
+
+    Filtering big lists of Videos with linear scans gets slow. A VideoIndex
+    keeps inverted postings for term attributes and sorted arrays for
+    numeric attributes, so queries only touch matching videos:
+
+        index = VideoIndex()
+        index.add_all(client.user_videos('mahalobaking'))
+        index.query(keywords='cake', duration=(60, 600), view_count=(1000, None))
+
+    Term fields: keywords, title (words in the title), category, author and
+    private. Terms are matched case-insensitively; pass a list to require
+    several terms of the same field.
+
+    Numeric fields: duration, view_count, like_count, dislike_count,
+    favorite_count, comment_count and published. Ranges are (low, high)
+    tuples, inclusive, where None leaves that end open; published ranges
+    take datetimes.
+"""
+import array
+import bisect
+import calendar
+import datetime
+import itertools
+import operator
+import re
+
+
+TERM_FIELDS = ('keywords', 'title', 'category', 'author', 'private')
+NUMERIC_FIELDS = ('duration', 'view_count', 'like_count', 'dislike_count',
+                  'favorite_count', 'comment_count', 'published')
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _terms(video, field):
+    """ Returns the normalized terms a video has for a term field """
+    if field == 'keywords':
+        return set(k.lower() for k in getattr(video, 'keywords', ()))
+    if field == 'title':
+        return set(WORD_RE.findall(getattr(video, 'title', u'').lower()))
+    if field == 'private':
+        return set([bool(getattr(video, 'private', False))])
+    value = getattr(video, field, None)
+    return set([value.lower()]) if value is not None else set()
+
+
+def _number(value):
+    if isinstance(value, datetime.datetime):
+        return calendar.timegm(value.timetuple())
+    return value
+
+
+class NumericColumn(object):
+    """ Values of one numeric field, kept as parallel arrays of values and
+        document numbers sorted by value.
+
+        Inserts are buffered and, on the next range query, sorted into a
+        small delta list that is searched alongside the main arrays. The
+        delta is merged into the main arrays once it outgrows 1/DELTA_RATIO
+        of their size, so a query after an insert doesn't re-sort the whole
+        column.
+    """
+
+    MIN_DELTA = 1024
+    DELTA_RATIO = 16
+
+    def __init__(self):
+        self.values = array.array('d')
+        self.docs = array.array('l')
+        self._delta = []
+        self._pending = []
+
+    def add(self, value, doc):
+        self._pending.append((value, doc))
+
+    def _merge(self):
+        if len(self._pending) < 64:
+            for item in self._pending:
+                bisect.insort(self._delta, item)
+            self._pending = []
+        elif self._pending:
+            # the delta is already sorted, so this only sorts the pending
+            # items and merges the two runs
+            self._delta += self._pending
+            self._delta.sort()
+            self._pending = []
+        if len(self._delta) > max(self.MIN_DELTA, len(self.values) // self.DELTA_RATIO):
+            merged = zip(self.values, self.docs) + self._delta
+            merged.sort()
+            self.values = array.array('d', map(operator.itemgetter(0), merged))
+            self.docs = array.array('l', map(operator.itemgetter(1), merged))
+            self._delta = []
+
+    def range(self, low, high):
+        """ Returns the set of documents with low <= value <= high """
+        self._merge()
+        low = None if low is None else _number(low)
+        high = None if high is None else _number(high)
+        start = 0 if low is None else bisect.bisect_left(self.values, low)
+        stop = len(self.values) if high is None else bisect.bisect_right(self.values, high)
+        docs = set(self.docs[start:stop])
+        if self._delta:
+            start = 0 if low is None else bisect.bisect_left(self._delta, (low,))
+            stop = (len(self._delta) if high is None else
+                    bisect.bisect_right(self._delta, (high, float('inf'))))
+            docs.update(doc for value, doc in self._delta[start:stop])
+        return docs
+
+    def compact(self, remap):
+        """ Drops the documents missing from remap and renumbers the rest """
+        self._merge()
+        values, docs = array.array('d'), array.array('l')
+        for value, doc in itertools.izip(self.values, self.docs):
+            if doc in remap:
+                values.append(value)
+                docs.append(remap[doc])
+        self.values, self.docs = values, docs
+        self._delta = [(value, remap[doc]) for value, doc in self._delta if doc in remap]
+
+
+class VideoIndex(object):
+    """ Indexes Videos by their attributes.
+
+        Adding a video whose id is already indexed replaces the old entry.
+        Pass store_videos=False to keep only ids, if the Video objects
+        themselves are stored elsewhere.
+
+        Removed (and replaced) videos leave dead entries behind, which are
+        skipped by queries; once they make up half of the index, it is
+        compacted to reclaim their memory.
+    """
+
+    MIN_COMPACT = 1024
+
+    def __init__(self, store_videos=True):
+        self.store_videos = store_videos
+        self._ids = []
+        self._videos = []
+        self._docs = {}
+        self._deleted = set()
+        self._postings = dict((field, {}) for field in TERM_FIELDS)
+        self._numeric = dict((field, NumericColumn()) for field in NUMERIC_FIELDS)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, video_id):
+        return video_id in self._docs
+
+    def add(self, video):
+        """ Adds (or replaces) a video in the index """
+        if video.id in self._docs:
+            self.remove(video.id)
+        doc = len(self._ids)
+        self._ids.append(video.id)
+        self._videos.append(video if self.store_videos else None)
+        self._docs[video.id] = doc
+        for field in TERM_FIELDS:
+            postings = self._postings[field]
+            for term in _terms(video, field):
+                postings.setdefault(term, set()).add(doc)
+        for field in NUMERIC_FIELDS:
+            value = getattr(video, field, None)
+            if value is not None:
+                self._numeric[field].add(_number(value), doc)
+
+    def add_all(self, videos):
+        """ Adds every video from an iterable, such as a VideoStream.
+            Returns the number of videos added.
+        """
+        n = 0
+        for video in videos:
+            self.add(video)
+            n += 1
+        return n
+
+    def remove(self, video_id):
+        """ Removes a video from the index """
+        doc = self._docs.pop(video_id)
+        video = self._videos[doc]
+        self._videos[doc] = None
+        if video is not None:
+            for field in TERM_FIELDS:
+                for term in _terms(video, field):
+                    self._postings[field][term].discard(doc)
+        # numeric columns (and postings, when videos aren't stored) are
+        # filtered through the deleted set instead
+        self._deleted.add(doc)
+        if len(self._deleted) >= max(self.MIN_COMPACT, len(self._ids) // 2):
+            self.compact()
+
+    def compact(self):
+        """ Drops removed videos from every structure, renumbering the
+            remaining ones.
+        """
+        if not self._deleted:
+            return
+        remap = {}
+        ids, videos = [], []
+        for doc, video_id in enumerate(self._ids):
+            if doc not in self._deleted:
+                remap[doc] = len(ids)
+                ids.append(video_id)
+                videos.append(self._videos[doc])
+        self._ids, self._videos = ids, videos
+        self._docs = dict((video_id, doc) for doc, video_id in enumerate(ids))
+        for field in TERM_FIELDS:
+            postings = {}
+            for term, docs in self._postings[field].iteritems():
+                docs = set(remap[doc] for doc in docs if doc in remap)
+                if docs:
+                    postings[term] = docs
+            self._postings[field] = postings
+        for column in self._numeric.itervalues():
+            column.compact(remap)
+        self._deleted = set()
+
+    def terms(self, field):
+        """ Returns the distinct terms indexed for a field """
+        deleted = self._deleted
+        return [term for term, docs in self._postings[field].iteritems()
+                if any(doc not in deleted for doc in docs)]
+
+    def _match(self, filters):
+        candidates = []
+        for field, value in filters.iteritems():
+            if field in TERM_FIELDS:
+                if isinstance(value, (list, tuple, set)):
+                    terms = value
+                else:
+                    terms = [value]
+                for term in terms:
+                    if isinstance(term, basestring):
+                        term = term.lower()
+                    candidates.append(self._postings[field].get(term, set()))
+            elif field in NUMERIC_FIELDS:
+                low, high = value
+                candidates.append(self._numeric[field].range(low, high))
+            else:
+                raise TypeError("Unknown index field: %s" % field)
+
+        if not candidates:
+            return set(self._docs.itervalues())
+        # intersect starting from the smallest candidate set
+        candidates.sort(key=len)
+        result = set(candidates[0])
+        for docs in candidates[1:]:
+            if not result:
+                break
+            result &= docs
+        return result - self._deleted
+
+    def query(self, limit=None, **filters):
+        """ Returns the ids of videos matching every filter, in the order
+            they were added.
+        """
+        docs = sorted(self._match(filters))
+        if limit is not None:
+            docs = docs[:limit]
+        return [self._ids[doc] for doc in docs]
+
+    def videos(self, limit=None, **filters):
+        """ Like query, but returns the Video objects """
+        assert self.store_videos, "This index does not store videos"
+        docs = sorted(self._match(filters))
+        if limit is not None:
+            docs = docs[:limit]
+        return [self._videos[doc] for doc in docs]
+
+    def get(self, video_id):
+        """ Returns an indexed Video by id """
+        assert self.store_videos, "This index does not store videos"
+        return self._videos[self._docs[video_id]]
@@ -0,0 +1,232 @@
+""" A typed query builder for video searches and uploads.
+
+    VideoQuery compiles filters into the gdata query parameters the API
+    understands, so the API does the filtering instead of pytube fetching
+    and parsing videos only to throw them away. Conditions the API can only
+    approximate (e.g. exact duration or publish date ranges) are pushed down
+    as the closest coarser API filter, and the exact condition is applied
+    lazily to the stream's videos:
+
+        query = (VideoQuery('baking')
+                 .category('Howto')
+                 .keywords('cake')
+                 .published_after(datetime.datetime(2011, 4, 1))
+                 .duration(60, 300)
+                 .order_by('published'))
+        videos = client.video_search(query)
+
+    When results are ordered by publish date, a published_after condition
+    also stops iteration as soon as older videos are reached.
+"""
+import datetime
+import itertools
+
+
+ORDERINGS = ('relevance', 'published', 'viewCount', 'rating')
+SAFE_SEARCH = ('none', 'moderate', 'strict')
+
+# gdata 'time' buckets, smallest first
+TIME_WINDOWS = (
+    ('today', datetime.timedelta(days=1)),
+    ('this_week', datetime.timedelta(days=7)),
+    ('this_month', datetime.timedelta(days=30)),
+)
+
+# gdata 'duration' buckets, in whole seconds: (name, minimum, maximum), both
+# inclusive. short is under 4 minutes and long is over 20 minutes.
+DURATIONS = (
+    ('short', 0, 4 * 60 - 1),
+    ('medium', 4 * 60, 20 * 60),
+    ('long', 20 * 60 + 1, None),
+)
+
+
+class VideoQuery(object):
+    """ Builds a video query. Every method returns a new VideoQuery, so
+        queries can be shared and extended.
+    """
+
+    def __init__(self, text=None):
+        self._text = text
+        self._author = None
+        self._categories = ()
+        self._keywords = ()
+        self._order = None
+        self._safe_search = None
+        self._after = None
+        self._before = None
+        self._duration = None
+        self._predicates = ()
+
+    def _copy(self, **changes):
+        query = VideoQuery.__new__(VideoQuery)
+        query.__dict__.update(self.__dict__)
+        for name, value in changes.iteritems():
+            setattr(query, '_' + name, value)
+        return query
+
+    def text(self, text):
+        """ Full text search terms """
+        return self._copy(text=text)
+
+    def author(self, username):
+        """ Only videos uploaded by username """
+        return self._copy(author=username)
+
+    def category(self, *categories):
+        """ Only videos in any of the given categories (e.g. 'Music') """
+        return self._copy(categories=self._categories + categories)
+
+    def keywords(self, *keywords):
+        """ Only videos tagged with every keyword; prefix a keyword with -
+            to exclude videos tagged with it.
+        """
+        return self._copy(keywords=self._keywords + keywords)
+
+    def order_by(self, ordering):
+        assert ordering in ORDERINGS, "ordering must be one of %s" % (ORDERINGS,)
+        return self._copy(order=ordering)
+
+    def safe_search(self, level):
+        assert level in SAFE_SEARCH, "safe search must be one of %s" % (SAFE_SEARCH,)
+        return self._copy(safe_search=level)
+
+    def published_after(self, when):
+        """ Only videos published at or after `when`, a datetime or a
+            timedelta before now.
+        """
+        if isinstance(when, datetime.timedelta):
+            when = datetime.datetime.utcnow() - when
+        return self._copy(after=when)
+
+    def published_before(self, when):
+        """ Only videos published before `when` """
+        return self._copy(before=when)
+
+    def duration(self, minimum=None, maximum=None):
+        """ Only videos lasting between minimum and maximum seconds """
+        return self._copy(duration=(minimum, maximum))
+
+    def where(self, predicate):
+        """ Only videos for which predicate(video) is true. This can't be
+            pushed down to the API, so it is checked on every fetched video.
+        """
+        return self._copy(predicates=self._predicates + (predicate,))
+
+    def _time_window(self):
+        if self._after is None:
+            return None
+        age = datetime.datetime.utcnow() - self._after
+        for name, window in TIME_WINDOWS:
+            if age <= window:
+                return name
+        return None
+
+    def _duration_bucket(self):
+        if self._duration is None:
+            return None
+        minimum, maximum = self._duration
+        for name, low, high in DURATIONS:
+            if ((minimum or 0) >= low and
+                (high is None or (maximum is not None and maximum <= high))):
+                return name
+        return None
+
+    def params(self, include_author=True):
+        """ Returns the gdata query parameters for this query """
+        params = {}
+        if self._text:
+            params['q'] = self._text
+        if self._author and include_author:
+            params['author'] = self._author
+        categories = []
+        if self._categories:
+            # categories are OR'd, keywords are AND'd
+            categories.append('|'.join(self._categories))
+        categories.extend(k.lower() for k in self._keywords)
+        if categories:
+            params['category'] = ','.join(categories)
+        if self._order:
+            params['orderby'] = self._order
+        if self._safe_search:
+            params['safeSearch'] = self._safe_search
+        if self._time_window():
+            params['time'] = self._time_window()
+        if self._duration_bucket():
+            params['duration'] = self._duration_bucket()
+        return params
+
+    def predicates(self):
+        """ Returns the conditions that must be checked on fetched videos """
+        predicates = list(self._predicates)
+        if self._after is not None:
+            after = self._after
+            predicates.append(lambda v: v.published >= after)
+        if self._before is not None:
+            before = self._before
+            predicates.append(lambda v: v.published < before)
+        if self._duration is not None:
+            minimum, maximum = self._duration
+            # videos without a duration can't be known to match either bound
+            if minimum is not None:
+                predicates.append(lambda v: getattr(v, 'duration', None) is not None and
+                                  v.duration >= minimum)
+            if maximum is not None:
+                predicates.append(lambda v: getattr(v, 'duration', None) is not None and
+                                  v.duration <= maximum)
+        return predicates
+
+    def stop_condition(self):
+        """ Returns a function telling when no later video can match, or
+            None. That is only known when ordering by publish date.
+        """
+        if self._order == 'published' and self._after is not None:
+            after = self._after
+            return lambda v: v.published < after
+        return None
+
+    def apply(self, stream):
+        """ Wraps stream in a FilteredStream if any conditions remain to be
+            checked locally; otherwise returns it untouched.
+        """
+        predicates = self.predicates()
+        if not predicates:
+            return stream
+        return FilteredStream(stream, predicates, self.stop_condition())
+
+
+class FilteredStream(object):
+    """ Lazily filters a stream's items through predicates.
+
+        Items are fetched from the underlying stream page by page, as they
+        are iterated. Since the number of matching items isn't known until
+        the stream has been read, FilteredStreams have no length.
+    """
+
+    def __init__(self, stream, predicates, stop=None):
+        self.stream = stream
+        self.predicates = predicates
+        self.stop = stop
+
+    def __iter__(self):
+        for item in self.stream:
+            if self.stop is not None and self.stop(item):
+                return
+            if all(predicate(item) for predicate in self.predicates):
+                yield item
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if ((key.start or 0) < 0 or (key.stop is not None and key.stop < 0)):
+                raise ValueError("Negative indexing is not supported")
+            return list(itertools.islice(self, key.start, key.stop, key.step))
+        if not isinstance(key, (int, long)):
+            raise TypeError
+        if key < 0:
+            raise ValueError("Negative indexing is not supported")
+        for item in itertools.islice(self, key, key + 1):
+            return item
+        raise IndexError
+
+    def __repr__(self):
+        return "<Filtered %r>" % (self.stream,)
@@ -0,0 +1,109 @@
+""" Sharing one request budget between interactive and batch work.
+
+    A RequestScheduler hands out permission to send API requests at no more
+    than `rate` requests per second. Requests waiting for permission are
+    served by priority class first, so user-facing lookups never queue
+    behind a crawl; batch work gets whatever capacity is left. Within a
+    class, callers share the budget by weighted fair queueing, so one busy
+    caller can't starve the others.
+
+        scheduler = RequestScheduler(rate=10)
+        scheduler.set_weight('reports', 3)
+        client = pytube.Client('appid', scheduler=scheduler)
+
+        with client.request_context(caller='reports'):
+            ...
+
+    The Client tags stream pagination and video updates as batch work and
+    everything else as interactive; request_context overrides the tag.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+from pytube.utils import TokenBucket
+
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITIES = (INTERACTIVE, BATCH)
+
+
+class RequestScheduler(object):
+    """ Grants requests within a global rate budget by priority class, and
+        by weighted fair queueing between callers within a class.
+
+        rate    - requests per second
+        burst   - requests that may be sent at once after an idle period
+    """
+
+    def __init__(self, rate, burst=None, clock=time.time):
+        self.budget = TokenBucket(rate, burst, clock)
+        self.clock = clock
+        self._weights = {}
+        self._queues = dict((priority, []) for priority in PRIORITIES)
+        # per class virtual time, and the finish tag of each caller's last
+        # request, for weighted fair queueing
+        self._virtual_time = dict((priority, 0.0) for priority in PRIORITIES)
+        self._finish = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self.granted = dict((priority, 0) for priority in PRIORITIES)
+
+    def set_weight(self, caller, weight):
+        """ Gives caller `weight` times the share of an ordinary caller """
+        self._weights[caller] = float(weight)
+
+    def _head(self):
+        for priority in PRIORITIES:
+            if self._queues[priority]:
+                return self._queues[priority][0]
+        return None
+
+    def acquire(self, priority=INTERACTIVE, caller=None):
+        """ Blocks until a request may be sent """
+        assert priority in PRIORITIES, "Unknown priority: %s" % (priority,)
+        with self._condition:
+            key = (priority, caller)
+            start = max(self._virtual_time[priority], self._finish.get(key, 0.0))
+            finish = start + 1.0 / self._weights.get(caller, 1.0)
+            self._finish[key] = finish
+            ticket = (finish, self._sequence.next(), priority)
+            heapq.heappush(self._queues[priority], ticket)
+            try:
+                while True:
+                    if self._head() is ticket:
+                        wait = self.budget.wait_time()
+                        if wait <= 0 and self.budget.try_acquire():
+                            break
+                        self._condition.wait(max(wait, 0.001))
+                    else:
+                        self._condition.wait()
+            except:
+                self._queues[priority].remove(ticket)
+                heapq.heapify(self._queues[priority])
+                self._condition.notify_all()
+                raise
+            heapq.heappop(self._queues[priority])
+            self._virtual_time[priority] = finish
+            self.granted[priority] += 1
+            self._condition.notify_all()
+
+    def try_acquire(self, priority=INTERACTIVE, caller=None):
+        """ Grants a request only if it can be sent right away without
+            jumping ahead of waiting requests; returns whether it was granted.
+        """
+        assert priority in PRIORITIES, "Unknown priority: %s" % (priority,)
+        with self._condition:
+            if self._head() is not None or not self.budget.try_acquire():
+                return False
+            self.granted[priority] += 1
+            return True
+
+    def waiting(self, priority=None):
+        """ Returns the number of requests waiting, in one class or all """
+        with self._condition:
+            if priority is not None:
+                return len(self._queues[priority])
+            return sum(len(q) for q in self._queues.itervalues())
@@ -1,3 +1,12 @@
+import collections
+import logging
+import threading
+import time
+import urlparse
+
+from pytube.scheduler import BATCH
+
+
 class YtData(object):
     """Provides some base functions for parsing common youtube responses"""
 
@@ -26,26 +35,152 @@ class YtData(object):
                 setattr(self, feedtype + '_count', feed[u'countHint'])
 
 
+class StreamState(object):
+    """ The fetched results and total count of a stream. Streams for the
+        same feed may share one StreamState, and with it their cache.
+    """
+
+    def __init__(self):
+        self.results = []
+        self.count = None
+        # feed level attributes parsed from the responses, see
+        # Stream._feed_attributes
+        self.attributes = {}
+        self.created = time.time()
+        # held while filling the cache, so that streams sharing this state
+        # don't fetch the same pages twice
+        self.lock = threading.RLock()
+
+
+class StreamRegistry(object):
+    """ Hands out shared StreamStates for equivalent streams.
+
+        Streams are equivalent when they are of the same class and have the
+        same uri and query, regardless of query parameter order or whether
+        the parameters are in the uri or the query dict.
+
+        At most max_size states are kept, evicting the least recently used;
+        states older than ttl seconds are replaced with fresh ones, so that
+        new streams don't serve stale results forever.
+    """
+
+    def __init__(self, max_size=1000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._states = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(cls, uri, query):
+        url = urlparse.urlparse(uri)
+        params = urlparse.parse_qsl(url.query, True)
+        # keep values as the bytes urlencode will send
+        params.extend((k, v if isinstance(v, str) else unicode(v).encode('utf-8'))
+                      for k, v in query.iteritems() if v is not None)
+        return (cls.__name__, url.scheme.lower(), url.netloc.lower(), url.path,
+                tuple(sorted(params)))
+
+    def get(self, cls, uri, query):
+        """ Returns the shared state for a stream """
+        key = self.key(cls, uri, query)
+        with self._lock:
+            state = self._states.pop(key, None)
+            if state is None or (self.ttl is not None and
+                                 time.time() - state.created > self.ttl):
+                state = StreamState()
+            self._states[key] = state
+            while len(self._states) > self.max_size:
+                self._states.popitem(last=False)
+        return state
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+    def __len__(self):
+        return len(self._states)
+
+
 class Stream(YtData):
     """ Implements get and slice operations against the notion of a youtube
         result stream. This allows us to expose paginated results from the
         youtube API via the normal python index/slice notation.
 
         Maintains an internal results cache in order to minimize youtube API
-        hits.
+        hits. If the client has a stream_registry, the cache is shared with
+        every equivalent stream built from the same client. Streams only
+        look up their shared cache once they are used, so the many streams
+        built along with every parsed Video don't crowd the registry.
     """
 
     # constants enforced by the API
     MAX_PAGE_SIZE = 50
     MAX_RESULTS = 1000
 
+    # attributes that _handle_data sets from the feed; they are kept on the
+    # StreamState so that every stream sharing it sees them
+    _feed_attributes = ()
+
     def __init__(self, client, uri, query=None):
         self.client = client
         self.uri = uri
         self.query = query or {}
+        self._state = None
+        self._count_hint = None
+
+    def _get_state(self):
+        if self._state is None:
+            registry = getattr(self.client, 'stream_registry', None)
+            if registry is not None:
+                state = registry.get(self.__class__, self.uri, self.query)
+            else:
+                state = StreamState()
+            if state.count is None:
+                state.count = self._count_hint
+            self._state = state
+        return self._state
+
+    def __getattr__(self, name):
+        if name in self._feed_attributes:
+            try:
+                return self._get_state().attributes[name]
+            except KeyError:
+                pass
+        raise AttributeError(name)
 
-        self._result_cache = []
-        self._count = None
+    def __setattr__(self, name, value):
+        if name in self._feed_attributes:
+            self._get_state().attributes[name] = value
+        else:
+            object.__setattr__(self, name, value)
+
+    def _get_result_cache(self):
+        return self._get_state().results
+
+    def _set_result_cache(self, results):
+        self._get_state().results = results
+
+    _result_cache = property(_get_result_cache, _set_result_cache)
+
+    def _get_count(self):
+        return self._get_state().count
+
+    def _set_count(self, count):
+        # counts are set from fresh responses, so they replace whatever the
+        # shared state holds
+        self._get_state().count = count
+
+    def _hint_count(self, count):
+        """ Records a count known without fetching the stream, such as a
+            video's comment count. It is used only until the stream has a
+            count of its own, and doesn't claim a place in the registry.
+        """
+        if self._state is None:
+            self._count_hint = count
+        elif self._state.count is None:
+            self._state.count = count
+
+    _count = property(_get_count, _set_count)
 
     def __len__(self):
         return self.count
@@ -67,33 +202,82 @@ class Stream(YtData):
     def __getitem__(self, key):
         if not isinstance(key, (int, long, slice)):
             raise TypeError
-        if ((not isinstance(key, slice) and (key < 0))
-            or (isinstance(key, slice) and ((key.start or 0) < 0)
-                and ((key.stop or 0) < 0))):
-            raise ValueError("Negative indexing is not supported")
 
         if isinstance(key, (int, long)):
+            if key < 0:
+                # negative indexes count back from the end of the
+                # accessible window of the stream
+                key += self._window()
+                if key < 0:
+                    raise IndexError
             if key >= self.MAX_RESULTS:
                 raise IndexError(
                     "Youtube API only supports fetching %s entries from a "
                     "Video Stream" % self.MAX_RESULTS)
-            if self._count is not None and self._count < key:
+            if self._count is not None and self._count <= key:
                 raise IndexError
             if key < len(self._result_cache):
                 return self._result_cache[key]
             # Can we get the key as part of a query that will fill the next
             # chunk of our result cache?
-            if key <= len(self._result_cache) + self.MAX_PAGE_SIZE:
+            if key < len(self._result_cache) + self.MAX_PAGE_SIZE:
                 self._fill_cache(self.MAX_PAGE_SIZE)
                 return self._result_cache[key]
             return self.get_at_index(key)
 
-        if key.stop <= len(self._result_cache):
-            return self._result_cache[key]
-        if key.start <= len(self._result_cache) + self.MAX_PAGE_SIZE:
-            self._fill_cache(key.stop - len(self._result_cache))
-            return self._result_cache[key]
-        return self.get_slice(key)
+        step = 1 if key.step is None else key.step
+        if step == 0:
+            raise ValueError("slice step cannot be zero")
+        if step < 0:
+            # walk back from start; fetch the span covered once, then step
+            # through it from its end
+            start, stop, step = key.indices(self._window())
+            positions = xrange(start, stop, step)
+            if not positions:
+                return []
+            return self._get_range(positions[-1], positions[0] + 1)[::step]
+
+        start, stop = key.start, key.stop
+        if ((start is not None and start < 0) or stop is None or stop < 0):
+            start, stop, unused = slice(start, stop).indices(self._window())
+        start = start or 0
+        stop = min(stop, self.MAX_RESULTS)
+        if stop <= start:
+            return []
+        results = self._get_range(start, stop)
+        if step != 1:
+            results = results[::step]
+        return results
+
+    def __reversed__(self):
+        """ Iterates the accessible window of the stream backwards, fetching
+            pages from the tail without reading the front of the stream.
+        """
+        stop = self._window()
+        while stop > 0:
+            start = max(0, stop - self.MAX_PAGE_SIZE)
+            for item in reversed(self._get_range(start, stop)):
+                yield item
+            stop = start
+
+    def _window(self):
+        """ Returns the number of entries the API will let us fetch.
+
+            If the count is not yet known, it is fetched along with only
+            the first entry of the stream.
+        """
+        if self._count is None and not self._result_cache:
+            self._fill_cache(1)
+        return min(self._count or 0, self.MAX_RESULTS)
+
+    def _get_range(self, start, stop):
+        """ Returns entries [start, stop), from the cache where possible """
+        if stop <= len(self._result_cache):
+            return self._result_cache[start:stop]
+        if start <= len(self._result_cache) + self.MAX_PAGE_SIZE:
+            self._fill_cache(stop - len(self._result_cache))
+            return self._result_cache[start:stop]
+        return self.get_slice(slice(start, stop))
 
     @property
     def count(self):
@@ -111,37 +295,45 @@ class Stream(YtData):
 
     def get_at_index(self, index):
         query = self.query.copy()
-        query.update({'max-results': 1, 'start-index': index, 'v': 2})
-        data = self.client._gdata_json(self.uri, query)
+        query.update({'max-results': 1, 'start-index': index + 1, 'v': 2})
+        data = self.client._gdata_json(self.uri, query, priority=BATCH)
         if u'entry' in data[u'feed']:
             return self._handle_data(data)[0]
         raise IndexError
 
-    def get_slice(self, key):
+    def iter_pages(self, start, stop):
+        """ Yields the raw API responses covering entries [start, stop),
+            without parsing them.
+        """
         # youtube results are 1-indexed, while python slices are 0-indexed.
         # offset start and stop by 1
-        start, stop =  key.start + 1, key.stop + 1
-        index = start
-        results = []
+        index, stop = start + 1, stop + 1
         while index < stop:
             query = self.query.copy()
             query.update({
-                'max-results': min(stop - index, 50),
+                'max-results': min(stop - index, self.MAX_PAGE_SIZE),
                 'start-index': index,
                 'v': 2
             })
-            data = self._handle_data(self.client._gdata_json(self.uri, query))
-            index += len(data)
-            results += data
-            if len(data) < query['max-results']: break
+            data = self.client._gdata_json(self.uri, query, priority=BATCH)
+            yield data
+            entries = len(data[u'feed'].get(u'entry', ()))
+            index += entries
+            if entries < query['max-results']: break
+
+    def get_slice(self, key):
+        results = []
+        for data in self.iter_pages(key.start, key.stop):
+            results += self._handle_data(data)
         return results
 
     def _fill_cache(self, count):
-        start = len(self._result_cache)
-        stop = start + count
-        data = self.get_slice(slice(start, stop))
-        self._result_cache += data
-        return len(data)
+        with self._get_state().lock:
+            start = len(self._result_cache)
+            stop = start + count
+            data = self.get_slice(slice(start, stop))
+            self._result_cache += data
+            return len(data)
 
     def _handle_data(self, data):
         """ Left to subclasses to implement.
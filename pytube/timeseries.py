@@ -0,0 +1,308 @@
+""" A compact time-series store for profile and video statistics.
+
+    Keeping a full Profile or Video snapshot per poll grows without limit.
+    StatsStore keeps only the statistics, appended to a single log file in
+    which every sample is stored as varint-encoded deltas from the previous
+    sample of the same entity; unchanged counters cost a byte each.
+
+        store = StatsStore('stats.log')
+        store.record_profile(client.user_profile('mahalobaking'))
+        store.record_video(client.video('4m1EFMoRFvY'))
+
+        timestamps, columns = store.series('profile:mahalobaking', start, stop)
+        store.rate('video:4m1EFMoRFvY', 'view_count')   # views per second
+
+    The log is append-only and read through mmap. Opening a store scans the
+    log once to index the samples of each entity; values are decoded on
+    demand, starting from the nearest keyframe (a sample stored with
+    absolute values, written every KEYFRAME_INTERVAL samples).
+
+    A store should only be written by one process at a time.
+"""
+import array
+import bisect
+import calendar
+import datetime
+import mmap
+import os
+import time
+
+
+PROFILE_FIELDS = ('subscriberCount', 'totalUploadViews', 'videoWatchCount',
+                  'viewCount', 'lastWebAccess')
+VIDEO_FIELDS = ('view_count', 'like_count', 'dislike_count', 'favorite_count',
+                'comment_count')
+
+# stored in place of statistics the API didn't return
+MISSING = -1
+
+DEFINE, KEYFRAME, DELTA = 0, 1, 2
+
+
+def encode_varint(value, out):
+    """ Appends an unsigned varint to the bytearray out """
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, position):
+    """ Reads an unsigned varint; returns (value, next position) """
+    result = shift = 0
+    while True:
+        byte = ord(data[position])
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def zigzag(value):
+    return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+
+def unzigzag(value):
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+
+def _timestamp(when):
+    if when is None:
+        return int(time.time())
+    if isinstance(when, datetime.datetime):
+        return calendar.timegm(when.timetuple())
+    return int(when)
+
+
+class _Entity(object):
+    """ Index of one entity's samples """
+
+    def __init__(self, id, name, fields):
+        self.id = id
+        self.name = name
+        self.fields = fields
+        self.timestamps = array.array('l')
+        self.offsets = array.array('l')
+        self.keyframes = array.array('l')   # sample numbers of keyframes
+        self.last = None                    # (timestamp, values) of the newest sample
+
+
+class StatsStore(object):
+    """ An append-only, delta encoded statistics log """
+
+    KEYFRAME_INTERVAL = 64
+
+    def __init__(self, path):
+        self.path = path
+        self._entities = {}
+        self._by_id = []
+        self._map = None
+        self._mapped = 0
+        self._file = open(path, 'ab')
+        # tell() in append mode isn't at the end until the first write
+        self._file.seek(0, os.SEEK_END)
+        self._load()
+
+    # reading
+
+    def _data(self):
+        """ Returns an mmap covering everything written so far """
+        self._file.flush()
+        size = os.path.getsize(self.path)
+        if self._map is None or self._mapped < size:
+            if self._map:
+                self._map.close()
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else ''
+            self._mapped = size
+        return self._map
+
+    def _decode_sample(self, data, position, entity):
+        """ Reads a sample record body; returns (timestamp, values, next position) """
+        timestamp, position = decode_varint(data, position)
+        values = []
+        for i in xrange(len(entity.fields)):
+            value, position = decode_varint(data, position)
+            values.append(unzigzag(value))
+        return unzigzag(timestamp), values, position
+
+    def _load(self):
+        data = self._data()
+        position = 0
+        try:
+            self._scan(data, position)
+        except IndexError:
+            # the last record was cut short by a crash while writing it;
+            # drop it so new records aren't appended to garbage
+            self._file.truncate(self._end)
+            self._file.seek(0, os.SEEK_END)
+            if self._map:
+                self._map.close()
+            self._map = None
+
+    def _scan(self, data, position):
+        self._end = position
+        while position < self._mapped:
+            kind = ord(data[position])
+            entity_id, body = decode_varint(data, position + 1)
+            if kind == DEFINE:
+                length, body = decode_varint(data, body)
+                name = data[body:body + length].decode('utf-8')
+                body += length
+                count, body = decode_varint(data, body)
+                fields = []
+                for i in xrange(count):
+                    length, body = decode_varint(data, body)
+                    fields.append(data[body:body + length])
+                    body += length
+                entity = _Entity(entity_id, name, tuple(fields))
+                self._entities[name] = entity
+                self._by_id.append(entity)
+                position = self._end = body
+                continue
+            entity = self._by_id[entity_id]
+            timestamp, values, end = self._decode_sample(data, body, entity)
+            if kind == DELTA:
+                last_timestamp, last_values = entity.last
+                timestamp += last_timestamp
+                values = [l + v for l, v in zip(last_values, values)]
+            else:
+                entity.keyframes.append(len(entity.timestamps))
+            entity.timestamps.append(timestamp)
+            entity.offsets.append(position)
+            entity.last = (timestamp, values)
+            position = self._end = end
+
+    def entities(self):
+        """ Returns the names of every recorded entity """
+        return self._entities.keys()
+
+    def fields(self, name):
+        return self._entities[name].fields
+
+    def series(self, name, start=None, stop=None):
+        """ Returns the samples of an entity taken in [start, stop) as
+            (timestamps, columns): an array of epoch seconds, and a dict
+            mapping each field to an array of values (MISSING where the API
+            didn't return a value). start and stop may be datetimes or epoch
+            seconds.
+        """
+        entity = self._entities[name]
+        first = 0 if start is None else bisect.bisect_left(entity.timestamps, _timestamp(start))
+        last = len(entity.timestamps) if stop is None else bisect.bisect_left(entity.timestamps, _timestamp(stop))
+        columns = dict((field, array.array('l')) for field in entity.fields)
+        if first >= last:
+            return array.array('l'), columns
+
+        # decode forward from the closest keyframe at or before first
+        keyframe = entity.keyframes[bisect.bisect_right(entity.keyframes, first) - 1]
+        data = self._data()
+        values = None
+        for n in xrange(keyframe, last):
+            position = entity.offsets[n]
+            kind = ord(data[position])
+            entity_id, body = decode_varint(data, position + 1)
+            timestamp, sample, end = self._decode_sample(data, body, entity)
+            if kind == DELTA:
+                values = [v + d for v, d in zip(values, sample)]
+            else:
+                values = sample
+            if n >= first:
+                for field, value in zip(entity.fields, values):
+                    columns[field].append(value)
+        return entity.timestamps[first:last], columns
+
+    def rate(self, name, field, start=None, stop=None):
+        """ Returns the average change per second of a field over the
+            samples in [start, stop), or None with fewer than two samples.
+        """
+        timestamps, columns = self.series(name, start, stop)
+        values = [(t, v) for t, v in zip(timestamps, columns[field]) if v != MISSING]
+        if len(values) < 2 or values[-1][0] == values[0][0]:
+            return None
+        return float(values[-1][1] - values[0][1]) / (values[-1][0] - values[0][0])
+
+    # writing
+
+    def _define(self, name, fields):
+        entity = _Entity(len(self._by_id), name, tuple(fields))
+        out = bytearray([DEFINE])
+        encode_varint(entity.id, out)
+        encoded = name.encode('utf-8')
+        encode_varint(len(encoded), out)
+        out.extend(encoded)
+        encode_varint(len(fields), out)
+        for field in fields:
+            field = str(field)
+            encode_varint(len(field), out)
+            out.extend(field)
+        self._file.write(out)
+        self._entities[name] = entity
+        self._by_id.append(entity)
+        return entity
+
+    def record(self, name, values, timestamp=None, fields=None):
+        """ Appends a sample for the named entity. values maps field names
+            to integers (or None); fields fixes the field order the first
+            time an entity is recorded and defaults to sorted(values).
+
+            Samples of an entity must be recorded in timestamp order;
+            recording one older than the entity's newest sample raises
+            ValueError.
+        """
+        timestamp = _timestamp(timestamp)
+        entity = self._entities.get(name)
+        if entity is not None and entity.last is not None and timestamp < entity.last[0]:
+            raise ValueError("Sample for %s at %d is older than its newest sample at %d"
+                             % (name, timestamp, entity.last[0]))
+        if entity is None:
+            entity = self._define(name, fields or sorted(values))
+        sample = [MISSING if values.get(f) is None else int(values[f]) for f in entity.fields]
+
+        keyframe = (entity.last is None or
+                    len(entity.timestamps) - entity.keyframes[-1] >= self.KEYFRAME_INTERVAL)
+        out = bytearray([KEYFRAME if keyframe else DELTA])
+        encode_varint(entity.id, out)
+        if keyframe:
+            encode_varint(zigzag(timestamp), out)
+            for value in sample:
+                encode_varint(zigzag(value), out)
+        else:
+            last_timestamp, last_values = entity.last
+            encode_varint(zigzag(timestamp - last_timestamp), out)
+            for value, last in zip(sample, last_values):
+                encode_varint(zigzag(value - last), out)
+
+        if keyframe:
+            entity.keyframes.append(len(entity.timestamps))
+        entity.offsets.append(self._file.tell())
+        entity.timestamps.append(timestamp)
+        entity.last = (timestamp, sample)
+        self._file.write(out)
+
+    def record_profile(self, profile, timestamp=None):
+        """ Records a Profile's statistics under 'profile:<username>' """
+        values = dict((f, profile.statistics.get(f)) for f in PROFILE_FIELDS)
+        if values['lastWebAccess'] is not None:
+            values['lastWebAccess'] = _timestamp(values['lastWebAccess'])
+        self.record('profile:' + profile.id, values, timestamp, PROFILE_FIELDS)
+
+    def record_video(self, video, timestamp=None):
+        """ Records a Video's statistics under 'video:<video_id>' """
+        values = dict((f, getattr(video, f, None)) for f in VIDEO_FIELDS)
+        self.record('video:' + video.id, values, timestamp, VIDEO_FIELDS)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+        if self._map:
+            self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
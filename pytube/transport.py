@@ -0,0 +1,398 @@
+""" Pluggable HTTP transports for the pytube Client.
+
+    A transport is any object with an open(request, timeout=None) method that
+    takes a urllib2.Request and returns a file-like response, raising
+    urllib2.HTTPError for error statuses just as urllib2.urlopen does.
+
+    Besides the default UrllibTransport, this module provides a
+    RecordingTransport, which captures request/response pairs into a cassette
+    file, a ReplayTransport, which serves a cassette back without touching
+    the network, and a HedgingTransport, which races a duplicate request
+    against slow ones.
+"""
+import collections
+import hashlib
+import httplib
+import mmap
+import os
+import Queue
+import struct
+import threading
+import time
+import urllib
+import urllib2
+import urlparse
+import zlib
+try: from cStringIO import StringIO
+except ImportError: from StringIO import StringIO
+try: import simplejson as json
+except ImportError: import json
+
+import pytube.exceptions
+
+
+class UrllibTransport(object):
+    """ Sends requests over the network with urllib2 """
+
+    def open(self, request, timeout=None):
+        return urllib2.urlopen(request, timeout=timeout)
+
+
+# path of the ClientLogin endpoint, whose requests carry passwords and whose
+# responses carry auth tokens
+LOGIN_PATH = '/accounts/ClientLogin'
+# recorded in place of credentials
+SCRUBBED = 'scrubbed'
+
+
+def _is_login(request):
+    return urlparse.urlparse(request.get_full_url()).path.endswith(LOGIN_PATH)
+
+
+def request_key(request):
+    """ Identifies a request independently of its query parameter order or
+        authorization headers; returns a 20 byte sha1 digest.
+
+        Login requests are identified by url alone, so that no digest of
+        the password ends up in a cassette.
+    """
+    url = urlparse.urlparse(request.get_full_url())
+    query = urllib.urlencode(sorted(urlparse.parse_qsl(url.query, True)))
+    digest = hashlib.sha1(request.get_method())
+    digest.update('\0' + url.scheme + '://' + url.netloc + url.path + '?' + query)
+    if not _is_login(request):
+        digest.update('\0' + (request.get_data() or ''))
+    return digest.digest()
+
+
+def scrub(request, status, headers, body):
+    """ Removes credentials from a response before it is recorded: cookies
+        are dropped, and the tokens of a successful login are replaced with
+        SCRUBBED. Returns (headers, body).
+    """
+    headers = ''.join(line for line in headers.splitlines(True)
+                      if not line.lower().startswith('set-cookie:'))
+    if _is_login(request) and status == 200:
+        body = ''.join('%s=%s\n' % (line.split('=', 1)[0], SCRUBBED) for line in body.split())
+    return headers, body
+
+
+def _response(url, status, headers, body):
+    """ Builds a urllib2-alike response (or HTTPError) from recorded data """
+    message = httplib.HTTPMessage(StringIO(headers))
+    if status >= 400:
+        return urllib2.HTTPError(url, status, httplib.responses.get(status, ''), message, StringIO(body))
+    return urllib.addinfourl(StringIO(body), message, url, status)
+
+
+# Cassette layout:
+#   MAGIC
+#   records: RECORD header (request key, payload length) followed by the
+#            zlib-compressed payload: PAYLOAD header, raw headers, body
+#   index:   json mapping hex request keys to [[offset, length], ...]
+#   TRAILER: index offset, TRAILER_MAGIC
+# A cassette whose recording was interrupted has no index; readers rebuild
+# it by scanning the records.
+MAGIC = 'PYTUBE-CASSETTE-1\n'
+RECORD = struct.Struct('>20sI')
+PAYLOAD = struct.Struct('>HdI')
+TRAILER = struct.Struct('>Q4s')
+TRAILER_MAGIC = 'PTIX'
+
+
+class RecordingTransport(object):
+    """ Passes requests through to another transport and records every
+        response into a cassette file.
+
+        Request headers (and with them authorization tokens) are never
+        recorded, and responses are scrubbed of credentials (see scrub), so
+        a cassette can be shared. Replaying a login yields a dummy token.
+
+        Call close() (or use the transport as a context manager) when done
+        recording so the cassette index is written.
+    """
+
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport or UrllibTransport()
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def open(self, request, timeout=None):
+        started = time.time()
+        try:
+            response = self.transport.open(request, timeout=timeout)
+        except urllib2.HTTPError, e:
+            body = e.read()
+            status, headers = e.code, e.info()
+        else:
+            body = response.read()
+            status, headers = response.getcode() or 200, response.info()
+        headers = ''.join(headers.headers) if headers is not None else ''
+        self.record(request, status, headers, body, time.time() - started)
+
+        response = _response(request.get_full_url(), status, headers, body)
+        if isinstance(response, urllib2.HTTPError):
+            raise response
+        return response
+
+    def record(self, request, status, headers, body, elapsed=0.0):
+        headers, body = scrub(request, status, headers, body)
+        payload = zlib.compress(PAYLOAD.pack(status, elapsed, len(headers)) + headers + body)
+        key = request_key(request)
+        with self._lock:
+            offset = self._file.tell() + RECORD.size
+            self._file.write(RECORD.pack(key, len(payload)))
+            self._file.write(payload)
+            self._index.setdefault(key.encode('hex'), []).append((offset, len(payload)))
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            offset = self._file.tell()
+            json.dump(self._index, self._file, separators=(',', ':'))
+            self._file.write(TRAILER.pack(offset, TRAILER_MAGIC))
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayTransport(object):
+    """ Serves responses from a cassette written by a RecordingTransport.
+
+        The cassette is memory-mapped, so only its index is parsed up front;
+        response bodies are read and decompressed on demand.
+
+        latency     - seconds to sleep before every response
+        realtime    - also sleep for as long as the recorded request took
+
+        When a request was recorded several times, the recordings are served
+        in order and the last one is repeated. Requests missing from the
+        cassette raise pytube.exceptions.CassetteMiss.
+    """
+
+    def __init__(self, path, latency=0.0, realtime=False):
+        self.path = path
+        self.latency = latency
+        self.realtime = realtime
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a pytube cassette" % path)
+        self._index = self._read_index()
+        self._served = {}
+        self._lock = threading.Lock()
+
+    def _read_index(self):
+        size = len(self._map)
+        if size >= len(MAGIC) + TRAILER.size:
+            offset, magic = TRAILER.unpack(self._map[size - TRAILER.size:])
+            if magic == TRAILER_MAGIC:
+                index = json.loads(self._map[offset:size - TRAILER.size])
+                return dict((k.decode('hex'), v) for k, v in index.iteritems())
+        return self._scan()
+
+    def _scan(self):
+        """ Rebuilds the index of a cassette that was never closed """
+        index = {}
+        position = len(MAGIC)
+        while position + RECORD.size <= len(self._map):
+            key, length = RECORD.unpack(self._map[position:position + RECORD.size])
+            position += RECORD.size
+            if position + length > len(self._map):
+                break  # truncated record
+            index.setdefault(key, []).append((position, length))
+            position += length
+        return index
+
+    def __len__(self):
+        return sum(len(v) for v in self._index.itervalues())
+
+    def open(self, request, timeout=None):
+        key = request_key(request)
+        with self._lock:
+            recordings = self._index.get(key)
+            if not recordings:
+                raise pytube.exceptions.CassetteMiss(request.get_full_url())
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+        offset, length = recordings[min(served, len(recordings) - 1)]
+        payload = zlib.decompress(self._map[offset:offset + length])
+        status, elapsed, headers_length = PAYLOAD.unpack(payload[:PAYLOAD.size])
+        headers = payload[PAYLOAD.size:PAYLOAD.size + headers_length]
+        body = payload[PAYLOAD.size + headers_length:]
+
+        delay = self.latency + (elapsed if self.realtime else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        response = _response(request.get_full_url(), status, headers, body)
+        if isinstance(response, urllib2.HTTPError):
+            raise response
+        return response
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def endpoint(url):
+    """ Groups urls by API endpoint, replacing user names and video ids
+        with '*': .../videos/abc/comments becomes .../videos/*/comments
+    """
+    url = urlparse.urlparse(url)
+    segments = url.path.split('/')
+    for i in xrange(1, len(segments)):
+        if segments[i - 1] in ('videos', 'users') and segments[i]:
+            segments[i] = '*'
+    return url.netloc + '/'.join(segments)
+
+
+class LatencyTracker(object):
+    """ Keeps the most recent `window` latencies for each endpoint """
+
+    def __init__(self, window=200):
+        self.window = window
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, latency):
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if latencies is None:
+                latencies = self._latencies[key] = collections.deque(maxlen=self.window)
+            latencies.append(latency)
+
+    def samples(self, key):
+        return len(self._latencies.get(key, ()))
+
+    def percentile(self, key, percentile):
+        """ Returns the given percentile (0-1) of the key's latencies """
+        with self._lock:
+            latencies = sorted(self._latencies.get(key, ()))
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile))]
+
+
+class HedgingTransport(object):
+    """ Cuts tail latency by hedging slow GET requests.
+
+        When a GET hasn't completed within the `percentile` latency of its
+        endpoint, a duplicate request is sent and whichever finishes first
+        is returned; the other's response is discarded when it arrives.
+        Hedges are only sent once an endpoint has `min_samples` latencies
+        recorded, and only while hedges make up at most `max_extra` of all
+        requests.
+
+        Hedges are sent below the client's scheduler, so they aren't held to
+        its rate budget; pass a budget callable, such as a RequestScheduler's
+        try_acquire, to charge them against it. It is called before each
+        hedge, and the hedge is skipped when it returns False.
+
+        Responses are read fully before being returned, so that a slow body
+        counts as a slow request.
+    """
+
+    def __init__(self, transport=None, percentile=0.95, max_extra=0.05,
+                 min_samples=20, min_delay=0.01, window=200, budget=None):
+        self.transport = transport or UrllibTransport()
+        self.budget = budget
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.latencies = LatencyTracker(window)
+        self.requests = 0
+        self.hedged = 0
+        self._lock = threading.Lock()
+
+    def _fetch(self, request, timeout):
+        """ Performs a request, returning a fully read response (or an
+            HTTPError carrying the full body)
+        """
+        try:
+            response = self.transport.open(request, timeout=timeout)
+        except urllib2.HTTPError, e:
+            headers = ''.join(e.info().headers) if e.info() is not None else ''
+            return _response(request.get_full_url(), e.code, headers, e.read())
+        try:
+            headers = response.info()
+            headers = ''.join(headers.headers) if headers is not None else ''
+            return _response(request.get_full_url(), response.getcode() or 200,
+                             headers, response.read())
+        finally:
+            response.close()
+
+    def _start(self, request, timeout, key, results):
+        def run():
+            started = time.time()
+            try:
+                result = (self._fetch(request, timeout), None)
+            except Exception, e:
+                result = (None, e)
+            else:
+                self.latencies.record(key, time.time() - started)
+            results.put(result)
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def _may_hedge(self):
+        with self._lock:
+            if self.hedged + 1 > self.max_extra * self.requests:
+                return False
+            if self.budget is not None and not self.budget():
+                return False
+            self.hedged += 1
+            return True
+
+    @staticmethod
+    def _unwrap(response):
+        if isinstance(response, urllib2.HTTPError):
+            raise response
+        return response
+
+    def open(self, request, timeout=None):
+        key = endpoint(request.get_full_url())
+        with self._lock:
+            self.requests += 1
+
+        if (request.get_method() != 'GET' or
+            self.latencies.samples(key) < self.min_samples):
+            started = time.time()
+            response = self._fetch(request, timeout)
+            self.latencies.record(key, time.time() - started)
+            return self._unwrap(response)
+
+        delay = max(self.min_delay, self.latencies.percentile(key, self.percentile))
+        results = Queue.Queue()
+        self._start(request, timeout, key, results)
+        try:
+            response, error = results.get(timeout=delay)
+        except Queue.Empty:
+            if not self._may_hedge():
+                response, error = results.get()
+            else:
+                self._start(request, timeout, key, results)
+                response, error = results.get()
+                if error is not None:
+                    # the first request failed outright; wait for the other
+                    response, error = results.get()
+        if error is not None:
+            raise error
+        return self._unwrap(response)
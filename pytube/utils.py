@@ -1,4 +1,10 @@
+import collections
 import datetime
+import mmap
+import multiprocessing
+import os
+import re
+import time
 import urlparse
 
 def yt_ts_to_datetime(yt_ts):
@@ -31,3 +37,125 @@ def video_id_from_youtube_url(url):
         return urlparse.parse_qs(parts.query)['v'][0]
     except KeyError:
         raise ValueError("Not a youtube video")
+
+
+# Matches the video id in the common youtube url forms:
+#   youtube.com/watch?v=<id>, on any subdomain (www., m.), with the v
+#   parameter anywhere in the query string
+#   youtube.com/watch#!v=<id> and m.youtube.com/#/watch?v=<id>, the
+#   fragment forms of the mobile site
+#   youtu.be/<id>
+#   youtube.com/embed/<id> and youtube.com/v/<id>
+YOUTUBE_URL_RE = re.compile(
+    r'(?:youtube\.com/(?:(?:#/)?watch(?:\?|#!)(?:[^\s"\'<>#]*?&(?:amp;)?)?v=|embed/|v/)'
+    r'|youtu\.be/)'
+    r'([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])')
+
+
+def _open_source(source):
+    """ Returns (chunks, cleanup) for extract_video_ids """
+    if isinstance(source, basestring):
+        f = open(source, 'rb')
+        if os.fstat(f.fileno()).st_size == 0:
+            f.close()
+            return [], lambda: None
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        def cleanup():
+            data.close()
+            f.close()
+        return [data], cleanup
+    return source, lambda: None
+
+
+def extract_video_ids(source):
+    """ Yields every youtube video id found in source, which may be a file
+        path (read through mmap) or an iterable of strings, such as an open
+        file. Text that isn't a youtube url is skipped silently.
+    """
+    chunks, cleanup = _open_source(source)
+    try:
+        for chunk in chunks:
+            for match in YOUTUBE_URL_RE.finditer(chunk):
+                yield match.group(1)
+    finally:
+        cleanup()
+
+
+def _count_range(args):
+    """ Counts the ids in a byte range of a file; the range is extended to
+        the end of the line it stops in, and starts after the first newline
+        unless it begins the file.
+    """
+    path, start, stop = args
+    counts = collections.Counter()
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if start > 0:
+                start = data.find('\n', start - 1) + 1 or len(data)
+            if stop < len(data):
+                stop = data.find('\n', stop - 1)
+                stop = len(data) if stop < 0 else stop
+            for match in YOUTUBE_URL_RE.finditer(data, start, stop):
+                counts[match.group(1)] += 1
+        finally:
+            data.close()
+    return counts
+
+
+def count_video_ids(source, processes=None, chunk_size=64 * 1024 * 1024):
+    """ Returns a collections.Counter of the youtube video ids in source
+        (see extract_video_ids).
+
+        If source is a file path and processes is given, the file is split
+        into chunks of about chunk_size bytes, on line boundaries, that are
+        scanned by a pool of `processes` worker processes.
+    """
+    if processes is None or not isinstance(source, basestring):
+        return collections.Counter(extract_video_ids(source))
+
+    size = os.path.getsize(source)
+    ranges = [(source, start, min(start + chunk_size, size))
+              for start in xrange(0, size, chunk_size)]
+    counts = collections.Counter()
+    pool = multiprocessing.Pool(processes)
+    try:
+        for partial in pool.imap_unordered(_count_range, ranges):
+            counts.update(partial)
+    finally:
+        pool.terminate()
+        pool.join()
+    return counts
+
+
+class TokenBucket(object):
+    """ A token bucket rate limiter: tokens accrue at `rate` per second, up
+        to `burst` tokens. Each request spends one token.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.time):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """ Spends tokens if they are available; returns whether it did """
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def wait_time(self, tokens=1):
+        """ Returns the seconds until `tokens` tokens will be available """
+        self._refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
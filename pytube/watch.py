@@ -0,0 +1,281 @@
+""" Adaptive polling of many channels for changes.
+
+    Polling every channel on a fixed timer wastes most requests on feeds
+    that haven't changed. A Watcher keeps an estimate of how often each
+    watched feed changes and polls it at a matching interval: feeds that
+    change often are polled often, quiet feeds back off towards
+    max_interval. All polls share one request budget.
+
+        watcher = Watcher(client, requests_per_second=5)
+        watcher.watch_uploads('mahalobaking')
+        watcher.watch_profile('mahalobaking')
+        watcher.run(handle_event)
+
+    Events are WatchEvent instances with one of these kinds:
+        new_videos        - data is a list of newly seen Videos
+        video_statistics  - data maps video ids to {stat: (old, new)}
+        profile_statistics - data maps stats to (old, new)
+"""
+import heapq
+import itertools
+import logging
+import time
+
+from pytube.scheduler import BATCH
+from pytube.stream import Stream
+from pytube.utils import TokenBucket
+
+
+VIDEO_STATISTICS = ('view_count', 'like_count', 'dislike_count', 'favorite_count', 'comment_count')
+PROFILE_STATISTICS = ('subscriberCount', 'totalUploadViews', 'videoWatchCount', 'viewCount')
+
+
+class WatchEvent(object):
+    """ Something changed on a watched feed """
+
+    def __init__(self, kind, username, data):
+        self.kind = kind
+        self.username = username
+        self.data = data
+
+    def __repr__(self):
+        return "<WatchEvent: %s %s>" % (self.kind, self.username)
+
+
+class Watch(object):
+    """ A single watched feed and its polling statistics.
+
+        The change rate is estimated as changes over elapsed time, both
+        exponentially decayed by `weight` per poll and seeded with a prior
+        of `target` changes per initial interval; the polling interval aims
+        for `target` changes per poll, clamped to [min_interval,
+        max_interval]. A quiet poll grows the interval by at most `backoff`
+        times, so a feed is only parked at max_interval after a run of
+        quiet polls.
+    """
+
+    kind = None
+
+    def __init__(self, username, interval, min_interval, max_interval, target=0.5,
+                 weight=0.3, backoff=2.0):
+        self.username = username
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target = target
+        self.weight = weight
+        self.backoff = backoff
+        self._decayed_changes = float(target)
+        self._decayed_time = float(interval)
+        self.rate = self._decayed_changes / self._decayed_time
+        self.last_poll = None
+        self.polls = 0
+        self.changes = 0
+
+    @property
+    def key(self):
+        return (self.kind, self.username)
+
+    def adapt(self, now, changed):
+        """ Updates the change rate estimate after a successful poll """
+        if self.last_poll is not None:
+            keep = 1 - self.weight
+            self._decayed_changes = keep * self._decayed_changes + (1 if changed else 0)
+            self._decayed_time = keep * self._decayed_time + max(now - self.last_poll, 1e-6)
+            self.rate = self._decayed_changes / self._decayed_time
+            if self.rate > 0:
+                interval = self.target / self.rate
+            else:
+                interval = self.max_interval
+            interval = min(interval, self.interval * self.backoff)
+            self.interval = min(self.max_interval, max(self.min_interval, interval))
+        self.last_poll = now
+        self.polls += 1
+        self.changes += bool(changed)
+
+    def poll(self, client):
+        """ Fetches the feed; returns a list of WatchEvents """
+        raise NotImplementedError
+
+    def changed(self, events):
+        """ Returns whether the events of a poll count as a change of the
+            feed for scheduling purposes.
+        """
+        return bool(events)
+
+
+class UploadsWatch(Watch):
+    """ Watches a channel for new uploads and for changes in the statistics
+        of its most recent `page_size` videos.
+
+        Statistics of a live channel change on nearly every poll, so only
+        new uploads drive the polling interval by default. Pass a
+        `threshold` to also count a poll in which some statistic of a video
+        changed by at least that fraction.
+    """
+    kind = 'uploads'
+
+    def __init__(self, username, interval, min_interval, max_interval, page_size=25,
+                 threshold=None, **kwargs):
+        Watch.__init__(self, username, interval, min_interval, max_interval, **kwargs)
+        self.page_size = min(page_size, Stream.MAX_PAGE_SIZE)
+        self.threshold = threshold
+        self.seen = None
+        self.statistics = {}
+
+    def poll(self, client):
+        # get_slice always asks the API, even when the client shares stream
+        # caches through a registry
+        videos = client.user_videos(self.username).get_slice(slice(0, self.page_size))
+        events = []
+        if self.seen is not None:
+            new = [v for v in videos if v.id not in self.seen]
+            if new:
+                events.append(WatchEvent('new_videos', self.username, new))
+        else:
+            self.seen = set()
+        self.seen.update(v.id for v in videos)
+
+        changed = {}
+        statistics = {}
+        for video in videos:
+            current = dict((name, getattr(video, name, None)) for name in VIDEO_STATISTICS)
+            statistics[video.id] = current
+            previous = self.statistics.get(video.id)
+            if previous is None:
+                continue
+            diff = dict((name, (previous[name], current[name]))
+                        for name in VIDEO_STATISTICS if previous[name] != current[name])
+            if diff:
+                changed[video.id] = diff
+        self.statistics = statistics
+        if changed:
+            events.append(WatchEvent('video_statistics', self.username, changed))
+        return events
+
+    def changed(self, events):
+        for event in events:
+            if event.kind == 'new_videos':
+                return True
+            if event.kind == 'video_statistics' and self.threshold is not None:
+                for diff in event.data.itervalues():
+                    for old, new in diff.itervalues():
+                        if old is None or new is None:
+                            continue
+                        if abs(new - old) >= self.threshold * max(abs(old), 1):
+                            return True
+        return False
+
+
+class ProfileWatch(Watch):
+    """ Watches a user's profile statistics """
+    kind = 'profile'
+
+    def __init__(self, *args, **kwargs):
+        Watch.__init__(self, *args, **kwargs)
+        self.statistics = None
+
+    def poll(self, client):
+        profile = client.user_profile(self.username)
+        current = dict((name, profile.statistics.get(name)) for name in PROFILE_STATISTICS)
+        previous, self.statistics = self.statistics, current
+        if previous is None:
+            return []
+        diff = dict((name, (previous[name], current[name]))
+                    for name in PROFILE_STATISTICS if previous[name] != current[name])
+        if diff:
+            return [WatchEvent('profile_statistics', self.username, diff)]
+        return []
+
+
+class Watcher(object):
+    """ Polls watched feeds, soonest due first, within a global budget of
+        requests_per_second (with bursts of up to `burst` requests).
+    """
+
+    def __init__(self, client, requests_per_second=1.0, burst=None,
+                 min_interval=60, max_interval=24 * 60 * 60, initial_interval=15 * 60,
+                 retry_interval=5 * 60, clock=time.time, sleep=time.sleep):
+        self.client = client
+        self.budget = TokenBucket(requests_per_second, burst, clock)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = initial_interval
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.sleep = sleep
+        self.watches = {}
+        self._queue = []
+        self._sequence = itertools.count()
+
+    def _add(self, watch):
+        if watch.key in self.watches:
+            return self.watches[watch.key]
+        self.watches[watch.key] = watch
+        # poll new feeds right away to get their baseline
+        heapq.heappush(self._queue, (self.clock(), self._sequence.next(), watch))
+        return watch
+
+    def watch_uploads(self, username, page_size=25, threshold=None):
+        """ Watches username's uploads for new videos and statistics
+            changes; see UploadsWatch for threshold.
+        """
+        return self._add(UploadsWatch(username, self.initial_interval,
+                                      self.min_interval, self.max_interval, page_size,
+                                      threshold))
+
+    def watch_profile(self, username):
+        """ Watches username's profile statistics """
+        return self._add(ProfileWatch(username, self.initial_interval,
+                                      self.min_interval, self.max_interval))
+
+    def unwatch(self, kind, username):
+        """ Stops watching a feed; it is dropped from the queue lazily """
+        self.watches.pop((kind, username), None)
+
+    def next_due(self):
+        """ Returns the time the next feed is due, or None if there are none """
+        while self._queue and self.watches.get(self._queue[0][2].key) is not self._queue[0][2]:
+            heapq.heappop(self._queue)
+        return self._queue[0][0] if self._queue else None
+
+    def poll_due(self):
+        """ Polls due feeds while the budget allows; returns their events """
+        events = []
+        while True:
+            due = self.next_due()
+            if due is None or due > self.clock() or not self.budget.try_acquire():
+                return events
+            due, sequence, watch = heapq.heappop(self._queue)
+            try:
+                with self.client.request_context(priority=BATCH, caller='watch'):
+                    new_events = watch.poll(self.client)
+            except Exception, e:
+                # a failed poll says nothing about how often the feed
+                # changes; try again soon without touching the estimate
+                logging.warning('polling %s for %s failed: %s', watch.kind, watch.username, e)
+                retry = min(watch.interval, self.retry_interval)
+                heapq.heappush(self._queue, (self.clock() + retry, self._sequence.next(), watch))
+                continue
+            now = self.clock()
+            watch.adapt(now, watch.changed(new_events))
+            heapq.heappush(self._queue, (now + watch.interval, self._sequence.next(), watch))
+            events.extend(new_events)
+
+    def run(self, callback, stop=None):
+        """ Polls feeds forever, passing every event to callback. Pass a
+            threading.Event as stop to end the loop.
+        """
+        while stop is None or not stop.is_set():
+            for event in self.poll_due():
+                callback(event)
+            due = self.next_due()
+            wait = self.budget.wait_time()
+            if due is not None:
+                wait = max(wait, due - self.clock())
+            else:
+                wait = max(wait, self.min_interval)
+            if stop is not None:
+                stop.wait(min(wait, self.min_interval))
+            else:
+                self.sleep(min(wait, self.min_interval))